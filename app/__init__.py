@@ -0,0 +1,58 @@
+from flask import Flask
+
+from config import settings
+
+
+def create_app(config: dict = None) -> Flask:
+    """
+    Build the Flask application. `config` overrides fields of config.settings (e.g. DATABASE_URL)
+    before anything reads them. Namespaces, schemas and models are imported here rather than at
+    module level, and no connection is opened: the engine is created on first use in each worker.
+    """
+    for name, value in (config or {}).items():
+        setattr(settings, name, value)
+
+    from flask import jsonify
+    from flask_login import LoginManager
+    from pydantic import ValidationError
+
+    from app import compression
+    from app.api import blueprint as api_blueprint
+    from app.cli import commands
+    from db.database import SessionLocal, get_db
+    from db.models import User
+
+    app = Flask(import_name=__name__)
+    app.config["SECRET_KEY"] = settings.SECRET_KEY
+
+    # Setup Flask-Login
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+
+    # Configure unauthorized handler to return 401
+    @login_manager.unauthorized_handler
+    def unauthorized():
+        return "", 401
+
+    @login_manager.user_loader
+    def load_user(user_id):
+        db = get_db()
+        return db.get(User, int(user_id))
+
+    @app.errorhandler(ValidationError)
+    def handle_pydantic_validation_error(e):
+        return jsonify({"error": "Validation error", "details": e.errors()}), 400
+
+    # Hand the request's session back to the pool instead of keeping it per thread forever
+    @app.teardown_appcontext
+    def remove_session(exception=None):
+        SessionLocal.remove()
+
+    compression.init_app(app)
+
+    for command in commands:
+        app.cli.add_command(command)
+
+    # Register API blueprint
+    app.register_blueprint(blueprint=api_blueprint, url_prefix="/api")
+    return app
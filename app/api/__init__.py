@@ -1,6 +1,8 @@
 from flask import Blueprint
 from flask_restx import Api
 
+from app.api.representations import output_json
+
 blueprint = Blueprint("api", __name__)
 
 api = Api(
@@ -10,6 +12,7 @@ api = Api(
     description="Book Store API with books and user management",
     doc="/docs",
 )
+api.representation("application/json")(output_json)
 
 # Import namespaces
 from app.api.books import ns as books_ns
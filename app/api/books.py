@@ -1,19 +1,44 @@
 from flask_restx import Resource, fields, Namespace
-from flask import request, jsonify
+from flask import Response, request
 from app.api import api
-from db.database import get_db
+from app.api.etag import catalog_etag
+from app.api.filters import DEFAULT_PRICE_BUCKET, DEFAULT_YEAR_BUCKET, apply_filters, apply_sort, book_facets, sort_columns
+from app.api.pagination import MAX_PAGE_SIZE, decode_cursor, paginate, pagination_headers, parse_limit
+from db.database import get_db, get_engine
 from db.models import Book, Genre, Review
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from app.schemas import BookCreate, BookUpdate, BookResponse, ReviewCreate, ReviewResponse
+from app.api.serializers import book_query, parse_fields, project, review_query, serialize_book, serialize_review
+from app.schemas import BookCreate, BookUpdate, ReviewCreate
+from app.search.fulltext import get_search_index
+from app.search.genres import match_genres
+from app.search.suggest import MAX_SUGGESTIONS, get_suggest_index
+from app.cache import VersionedLRUCache
+from app.recommend.also_bought import get_also_bought
+from app.recommend.similar import get_similar_index
+from config import settings
+from db.carts import remove_book_from_carts, reprice_book
+from db.changes import record_deletions
+from db.exporter import FORMATS as EXPORT_FORMATS, export_books
+from db.importer import FORMATS as IMPORT_FORMATS, detect_format, import_books
+from db.ratings import apply_review_delta
+from db.versions import bump_version, current_version
 from uuid import UUID
+from datetime import datetime
 from flask_login import login_required, current_user
-from sqlalchemy import func
-import json
+from sqlalchemy import tuple_
 from pydantic import ValidationError
 
 # Create namespace
 ns = Namespace("books", description="Book operations")
 
+# Serialized book details shared by all requests of this worker, see VersionedLRUCache
+book_cache = VersionedLRUCache(maxsize=settings.BOOK_CACHE_SIZE, ttl=settings.BOOK_CACHE_TTL)
+
+# ?fields= projection accepted by every endpoint returning books, see parse_fields
+FIELDS_PARAM = "Comma-separated fields to return, e.g. id,title,price (default: all)"
+# Writes to these stamp Book.text_version, which the in-memory indexes catch up on
+TEXT_FIELDS = {"title", "author", "description"}
+
 # Define models for Swagger documentation
 book_model = api.model(
     "Book",
@@ -32,6 +57,11 @@ book_model = api.model(
     },
 )
 
+batch_model = api.model(
+    "BookBatch",
+    {"ids": fields.List(fields.Integer, required=True, description="Book IDs, at most 500")},
+)
+
 review_model = api.model(
     "ReviewCreate",
     {
@@ -41,50 +71,46 @@ review_model = api.model(
 )
 
 
-def book_to_response(book: Book) -> dict:
-    return json.loads(
-        BookResponse(
-            id=book.id,
-            title=str(book.title),
-            author=str(book.author),
-            price=float(book.price),
-            genre=str(book.genre.name) if book.genre else "",
-            cover=str(book.cover),
-            description=str(book.description),
-            rating=float(book.rating) if book.rating is not None else 0.0,
-            year=int(book.year),
-            created_at=book.created_at,
-            updated_at=book.updated_at,
-        ).json()
-    )
-
-
-def review_to_response(review: Review) -> dict:
-    return json.loads(
-        ReviewResponse(
-            id=int(review.id),
-            user_id=int(review.user_id),
-            username=str(review.user.username),
-            rating=float(review.rating),
-            comment=str(review.comment) if review.comment else None,
-            created_at=review.created_at,
-        ).json()
-    )
-
-
 @ns.route("/")
 class BookList(Resource):
     @ns.doc("list_books")
-    @ns.marshal_list_with(book_model)
+    @ns.param("limit", "Page size", type=int, default=50)
+    @ns.param("cursor", "Opaque cursor from the previous page's X-Pagination.next_cursor")
+    @ns.param("price_min", "Minimum price", type=float)
+    @ns.param("price_max", "Maximum price", type=float)
+    @ns.param("year_from", "Earliest publication year", type=int)
+    @ns.param("year_to", "Latest publication year", type=int)
+    @ns.param("genre_id", "Genre ID", type=int)
+    @ns.param("rating_min", "Minimum rating", type=float)
+    @ns.param("sort", "id, price, year or rating; prefix with - for descending", default="id")
+    @ns.param("fields", FIELDS_PARAM)
+    @ns.param("ids", "Comma-separated book IDs to fetch instead of a page; returns {items, missing}")
+    @ns.param("facets", "Comma-separated facets to count: genre, price, year. Wraps the page in {items, facets}")
+    @ns.param("price_bucket", "Price histogram bucket width", type=float, default=DEFAULT_PRICE_BUCKET)
+    @ns.param("year_bucket", "Year histogram bucket width", type=int, default=DEFAULT_YEAR_BUCKET)
+    @ns.response(200, "Success", [book_model])
+    @ns.response(304, "Not modified since the ETag in If-None-Match")
+    @catalog_etag
     def get(self):
-        """List all books"""
+        """List books page by page with optional filters and sorting. Page metadata is in the X-Pagination header."""
+        fields = parse_fields(request.args.get("fields"))
+        if request.args.get("ids"):
+            return books_by_ids(parse_ids(request.args["ids"].split(",")), fields)
         db = get_db()
-        books = db.query(Book).all()
-        return [book_to_response(book) for book in books]
+        limit = parse_limit(request.args.get("limit"))
+        query = book_query(db, fields, also=sort_columns(request.args))
+        query, cursor_key = apply_sort(apply_filters(query, request.args), request.args)
+        books, next_cursor = paginate(query.limit(limit + 1).all(), limit, cursor_key)
+        items = [serialize_book(book, fields) for book in books]
+        headers = pagination_headers(limit, next_cursor)
+        facets = [name.strip() for name in request.args.get("facets", "").split(",") if name.strip()]
+        if facets:
+            return {"items": items, "facets": book_facets(db, request.args, facets)}, 200, headers
+        return items, 200, headers
 
     @ns.doc("create_book")
     @ns.expect(book_model)
-    @ns.marshal_with(book_model, code=201)
+    @ns.response(201, "Book created", book_model)
     def post(self):
         """Create a new book"""
         try:
@@ -101,7 +127,8 @@ class BookList(Resource):
             if not genre:
                 genre = Genre(name=book_data.genre)
                 db.add(genre)
-                db.commit()
+                db.flush()
+            version = bump_version(db)
             book = Book(
                 title=book_data.title,
                 author=book_data.author,
@@ -109,33 +136,115 @@ class BookList(Resource):
                 genre_id=genre.id,
                 cover=book_data.cover,
                 description=book_data.description,
-                rating=book_data.rating,
+                rating=0,
                 year=book_data.year,
+                text_version=version,
             )
             db.add(book)
             db.commit()
             db.refresh(book)
-            return book_to_response(book), 201
+            return serialize_book(book), 201
         except SQLAlchemyError as e:
             db.rollback()
             api.abort(400, str(e))
 
 
+def warming_up(index: str) -> tuple:
+    """503 for a request that came before this worker finished building one of its in-memory indexes"""
+    return {"message": f"The {index} index is still being built, retry shortly"}, 503, {"Retry-After": "5"}
+
+
+def parse_ids(values) -> list:
+    """Unique integer ids in the requested order, at most MAX_PAGE_SIZE of them"""
+    try:
+        ids = list(dict.fromkeys(int(value) for value in values))
+    except (TypeError, ValueError):
+        api.abort(400, message="ids must be integers")
+    if len(ids) > MAX_PAGE_SIZE:
+        api.abort(400, message=f"At most {MAX_PAGE_SIZE} ids per request")
+    return ids
+
+
+def books_by_ids(ids: list, fields: tuple = None) -> dict:
+    """
+    Serialized books in the requested order: cached ones from book_cache, the rest with one IN query.
+    Whole books are loaded so they can be cached; `fields` only trims the output.
+    """
+    version = current_version()
+    found = {}
+    misses = []
+    for book_id in ids:
+        cached = book_cache.get(book_id, version)
+        if cached is None:
+            misses.append(book_id)
+        else:
+            found[book_id] = cached
+    if misses:
+        for book in book_query(get_db()).filter(Book.id.in_(misses)):
+            found[book.id] = serialize_book(book)
+            book_cache.set(book.id, found[book.id], version)
+    return {
+        "items": [project(found[book_id], fields) for book_id in ids if book_id in found],
+        "missing": [book_id for book_id in ids if book_id not in found],
+    }
+
+
+def related_books(book_id: int, get_index, score_field: str, index_name: str):
+    """
+    Body of the endpoints listing the books related to one: `get_index(db)` gives a worker index whose
+    top(book_id, limit) returns [(book_id, score)] best first, or None while it is still being built
+    """
+    db = get_db()
+    if db.query(Book.id).filter(Book.id == book_id).scalar() is None:
+        api.abort(404, message=f"Book {book_id} not found")
+    limit = parse_limit(request.args.get("limit"), default=10, maximum=50)
+    index = get_index(db)
+    if index is None:
+        return warming_up(index_name)
+    neighbours = index.top(book_id, limit)
+    result = books_by_ids([other for other, _ in neighbours], parse_fields(request.args.get("fields")))
+    missing = set(result["missing"])  # deleted since the index was built or last caught up
+    found = [(other, score) for other, score in neighbours if other not in missing]
+    return [{**book, score_field: score} for book, (_, score) in zip(result["items"], found)]
+
+
+@ns.route("/batch")
+class BookBatch(Resource):
+    @ns.doc("get_books_batch")
+    @ns.param("fields", FIELDS_PARAM)
+    @ns.expect(batch_model)
+    @ns.response(200, "Books in the requested order and the ids that do not exist")
+    def post(self):
+        """Get many books by ID in one request; for id lists too long for ?ids="""
+        data = api.payload
+        if not isinstance(data, dict) or not isinstance(data.get("ids"), list):
+            api.abort(400, message="ids must be a list of integers")
+        return books_by_ids(parse_ids(data["ids"]), parse_fields(request.args.get("fields")))
+
+
 @ns.route("/<int:id>")
 class BookResource(Resource):
     @ns.doc("get_book")
-    @ns.marshal_with(book_model)
+    @ns.param("fields", FIELDS_PARAM)
+    @ns.response(200, "Success", book_model)
     def get(self, id: int):
         """Get a book by ID"""
+        fields = parse_fields(request.args.get("fields"))
+        version = current_version()
+        cached = book_cache.get(id, version)
+        if cached is not None:
+            return project(cached, fields)
         db = get_db()
-        book = db.query(Book).filter(Book.id == id).first()
+        book = book_query(db).filter(Book.id == id).first()
         if not book:
             api.abort(404, message=f"Book {id} not found")
-        return book_to_response(book)
+        response = serialize_book(book)
+        book_cache.set(id, response, version)
+        return project(response, fields)
 
     @ns.doc("update_book")
     @ns.expect(book_model)
-    @ns.marshal_with(book_model)
+    @ns.response(200, "Success", book_model)
     def put(self, id: int):
         """Update a book"""
         db = get_db()
@@ -144,8 +253,16 @@ class BookResource(Resource):
             api.abort(404, message=f"Book {id} not found")
 
         data = request.json
+        old_price = book.price
+        version = bump_version(db)
         for key, value in data.items():
             setattr(book, key, value)
+        if data.keys() & TEXT_FIELDS:
+            book.text_version = version
+        if "rating" in data:
+            book.rating_version = version
+        if book.price != old_price:
+            reprice_book(db, book.id, book.price - old_price)
 
         try:
             db.commit()
@@ -153,7 +270,7 @@ class BookResource(Resource):
             db.rollback()
             api.abort(400, message="Invalid data")
 
-        return book_to_response(book)
+        return serialize_book(book)
 
     @ns.doc("delete_book")
     @ns.response(204, "Book deleted")
@@ -164,21 +281,137 @@ class BookResource(Resource):
         if not book:
             api.abort(404, message=f"Book {id} not found")
 
+        remove_book_from_carts(db, id, book.price)
         db.delete(book)
+        record_deletions(db, [id], bump_version(db))
         db.commit()
         return "", 204
 
 
+@ns.route("/export")
+class BookExport(Resource):
+    @ns.doc("export_books")
+    @ns.param("format", "ndjson or csv", default="ndjson")
+    @ns.response(200, "The whole catalog, streamed in chunks")
+    @ns.response(304, "Not modified since the ETag in If-None-Match")
+    @catalog_etag
+    def get(self):
+        """Export the whole catalog as NDJSON or CSV, streamed from a server-side cursor"""
+        fmt = request.args.get("format", "ndjson")
+        if fmt not in EXPORT_FORMATS:
+            api.abort(400, message=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+        return Response(
+            export_books(get_engine(), fmt),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={"Content-Disposition": f"attachment; filename=books.{fmt}"},
+        )
+
+
+@ns.route("/import")
+class BookImport(Resource):
+    @ns.doc("import_books")
+    @ns.param("format", "ndjson or csv; defaults to the Content-Type, then ndjson")
+    @ns.response(200, "Import report: imported/failed counts, throughput and per-line errors")
+    def post(self):
+        """Bulk import books streamed in the request body as NDJSON or CSV (BookCreate fields per row)"""
+        fmt = request.args.get("format") or detect_format(request.content_type)
+        if fmt not in IMPORT_FORMATS:
+            api.abort(400, message=f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+        return import_books(get_db(), request.stream, fmt).to_dict(), 200
+
+
+@ns.route("/search")
+class BookSearch(Resource):
+    @ns.doc("search_books")
+    @ns.param("q", "Search query", required=True)
+    @ns.param("limit", "Number of results", type=int, default=20)
+    def get(self):
+        """Full-text search over title, author and description, ranked by BM25"""
+        query = request.args.get("q", "").strip()
+        if not query:
+            api.abort(400, message="Query parameter q is required")
+        limit = parse_limit(request.args.get("limit"), default=20, maximum=100)
+        index = get_search_index(get_db(), get_db)
+        if index is None:
+            return warming_up("search")
+        return index.search(query, limit)
+
+
+@ns.route("/suggest")
+class BookSuggest(Resource):
+    @ns.doc("suggest_books")
+    @ns.param("prefix", "What the user has typed so far", required=True)
+    @ns.param("limit", "Number of suggestions", type=int, default=10)
+    def get(self):
+        """Typeahead: best rated books whose title or author has a word starting with the prefix"""
+        prefix = request.args.get("prefix", "")
+        if not prefix.strip():
+            api.abort(400, message="Query parameter prefix is required")
+        limit = parse_limit(request.args.get("limit"), default=10, maximum=MAX_SUGGESTIONS)
+        index = get_suggest_index(get_db(), get_db)
+        if index is None:
+            return warming_up("suggest")
+        return index.suggest(prefix, limit)
+
+
+@ns.route("/cache-stats")
+class BookCacheStats(Resource):
+    @ns.doc("book_cache_stats")
+    def get(self):
+        """Hit/miss counters of this worker's book detail cache"""
+        return book_cache.stats()
+
+
 @ns.route("/top")
 class TopBooks(Resource):
     @ns.doc("top_books")
     @ns.param("limit", "Number of top books to return", type=int, default=10)
+    @ns.param("genre", "Genre ID or exact genre name")
+    @ns.param("fields", FIELDS_PARAM)
+    @ns.param("rank", "weighted (Bayesian average, default) or average (plain mean rating)", default="weighted")
+    @ns.response(304, "Not modified since the ETag in If-None-Match")
+    @catalog_etag
     def get(self):
-        """Get top books by average rating. Use ?limit=N to limit results."""
+        """Get top books, globally or within a genre. Served from the score/rating indexes in O(limit)."""
         db = get_db()
-        limit = int(request.args.get("limit", 10))
-        books = db.query(Book).order_by(Book.rating.desc()).limit(limit).all()
-        return [book_to_response(book) for book in books]
+        limit = parse_limit(request.args.get("limit"), default=10, maximum=100)
+        rank = request.args.get("rank", "weighted")
+        if rank not in ("weighted", "average"):
+            api.abort(400, message="rank must be weighted or average")
+        column = Book.score if rank == "weighted" else Book.rating
+        fields = parse_fields(request.args.get("fields"))
+        query = book_query(db, fields, also=(column,))
+        genre = request.args.get("genre")
+        if genre:
+            if genre.isdigit():
+                genre_id = int(genre)
+            else:
+                genre_id = db.query(Genre.id).filter(Genre.name == genre).scalar()
+                if genre_id is None:
+                    api.abort(404, message=f"Genre {genre} not found")
+            query = query.filter(Book.genre_id == genre_id)
+        books = query.order_by(column.desc(), Book.id.desc()).limit(limit).all()
+        return [serialize_book(book, fields) for book in books]
+
+
+@ns.route("/<int:book_id>/also-bought")
+class AlsoBought(Resource):
+    @ns.doc("also_bought")
+    @ns.param("limit", "Number of books to return", type=int, default=10)
+    @ns.param("fields", FIELDS_PARAM)
+    def get(self, book_id):
+        """Books most often ordered together with this one, with the number of such orders"""
+        return related_books(book_id, lambda db: get_also_bought(db, get_db), "bought_together", "also-bought")
+
+
+@ns.route("/<int:book_id>/similar")
+class SimilarBooks(Resource):
+    @ns.doc("similar_books")
+    @ns.param("limit", "Number of books to return", type=int, default=10)
+    @ns.param("fields", FIELDS_PARAM)
+    def get(self, book_id):
+        """Books with the most similar title, author and description (cosine of TF-IDF vectors)"""
+        return related_books(book_id, lambda db: get_similar_index(db, get_db), "similarity", "similar books")
 
 
 @ns.route("/<int:book_id>/review")
@@ -195,7 +428,10 @@ class BookReview(Resource):
         review_data = ReviewCreate(**data)
         # Найти существующий отзыв
         review = db.query(Review).filter_by(book_id=book.id, user_id=current_user.id).first()
+        version = bump_version(db)
         if review:
+            # Обновить агрегаты на разницу оценок
+            apply_review_delta(db, book.id, 0, review_data.rating - review.rating, version)
             review.rating = review_data.rating
             review.comment = review_data.comment
         else:
@@ -206,12 +442,9 @@ class BookReview(Resource):
                 comment=review_data.comment,
             )
             db.add(review)
+            apply_review_delta(db, book.id, 1, review_data.rating, version)
         db.commit()
-        # Пересчитать средний рейтинг
-        avg_rating = db.query(func.avg(Review.rating)).filter(Review.book_id == book.id).scalar()
-        book.rating = avg_rating
-        db.commit()
-        return review_to_response(review), 201
+        return serialize_review(review), 201
 
     @login_required
     def delete(self, book_id):
@@ -224,45 +457,59 @@ class BookReview(Resource):
         if not review:
             return {"error": "Review not found"}, 404
         db.delete(review)
-        db.commit()
-        # Пересчитать средний рейтинг
-        avg_rating = db.query(func.avg(Review.rating)).filter(Review.book_id == book.id).scalar()
-        avg_rating = 0 if avg_rating is None else avg_rating
-        book.rating = avg_rating
+        apply_review_delta(db, book.id, -1, -review.rating, bump_version(db))
         db.commit()
         return "", 204
 
 
 @ns.route("/<int:book_id>/reviews")
 class BookReviews(Resource):
+    @ns.doc("list_reviews")
+    @ns.param("limit", "Page size", type=int, default=50)
+    @ns.param("cursor", "Opaque cursor from the previous page's X-Pagination.next_cursor")
     def get(self, book_id):
-        """Get all reviews for a book."""
+        """Get a book's reviews newest first, page by page. Page metadata is in the X-Pagination header."""
         db = get_db()
-        book = db.query(Book).filter(Book.id == book_id).first()
-        if not book:
+        if db.query(Book.id).filter(Book.id == book_id).scalar() is None:
             return {"error": "Book not found"}, 404
-        reviews = db.query(Review).filter_by(book_id=book.id).order_by(Review.created_at.desc()).all()
-        return [review_to_response(r) for r in reviews]
+        limit = parse_limit(request.args.get("limit"))
+        query = review_query(db).filter(Review.book_id == book_id)
+        cursor = request.args.get("cursor")
+        if cursor:
+            values = decode_cursor(cursor)
+            try:
+                created_at, review_id = datetime.fromisoformat(values["created_at"]), int(values["id"])
+            except (KeyError, TypeError, ValueError):
+                api.abort(400, message="Invalid cursor")
+            query = query.filter(tuple_(Review.created_at, Review.id) < tuple_(created_at, review_id))
+        query = query.order_by(Review.created_at.desc(), Review.id.desc()).limit(limit + 1)
+        reviews, next_cursor = paginate(
+            query.all(), limit, lambda review: {"created_at": review.created_at.isoformat(), "id": review.id}
+        )
+        return [serialize_review(r) for r in reviews], 200, pagination_headers(limit, next_cursor)
 
 
 @ns.route("/genre/<string:genre_name>")
 @ns.param("genre_name", "The genre name")
 class BooksByGenre(Resource):
     @ns.doc("get_books_by_genre")
-    @ns.marshal_list_with(book_model)
+    @ns.param("fields", FIELDS_PARAM)
+    @ns.param("limit", "Page size", type=int, default=50)
+    @ns.param("cursor", "Opaque cursor from the previous page's X-Pagination.next_cursor")
+    @ns.param("sort", "id, price, year or rating; prefix with - for descending", default="id")
+    @ns.response(200, "Success", [book_model])
     def get(self, genre_name):
-        """Get all books by genre name (fuzzy search)"""
+        """Get books of every genre matching the name (substring or trigram similarity), page by page"""
         db = get_db()
 
-        # Находим жанры по названию с использованием ilike для нечеткого поиска
-        genres = db.query(Genre).filter(Genre.name.ilike(f"%{genre_name}%")).all()
-        if not genres:
-            return jsonify({"error": f"No genres found matching '{genre_name}'"}), 404
-
-        # Получаем все книги для найденных жанров
-        books = []
-        for genre in genres:
-            genre_books = db.query(Book).filter(Book.genre_id == genre.id).all()
-            books.extend([book_to_response(book) for book in genre_books])
+        # Жанры ищутся по триграммному индексу, книги всех найденных жанров - одним запросом
+        genre_ids = match_genres(db, genre_name)
+        if not genre_ids:
+            return {"error": f"No genres found matching '{genre_name}'"}, 404
 
-        return books
+        limit = parse_limit(request.args.get("limit"))
+        fields = parse_fields(request.args.get("fields"))
+        query = book_query(db, fields, also=sort_columns(request.args)).filter(Book.genre_id.in_(genre_ids))
+        query, cursor_key = apply_sort(query, request.args)
+        books, next_cursor = paginate(query.limit(limit + 1).all(), limit, cursor_key)
+        return [serialize_book(book, fields) for book in books], 200, pagination_headers(limit, next_cursor)
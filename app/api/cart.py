@@ -2,11 +2,22 @@ from flask import request
 from flask_restx import Resource, Namespace, fields
 from flask_login import login_required, current_user
 from http import HTTPStatus
-from db.models import Cart, CartItem, Book, Order, OrderItem, OrderStatus
-from app.schemas import CartItemCreate, CartResponse, OrderCreate
+from db.models import Cart, CartItem, Book, Order, OrderStatus
+from app.schemas import CartItemCreate, CartItemsUpdate, CartOperation, CartResponse, OrderCreate
 from db.database import get_db, session_scope
-from sqlalchemy import func
+from db.carts import (
+    CART_COLUMNS,
+    apply_cart_delta,
+    cart_state,
+    get_or_create_cart,
+    move_cart_to_order,
+    recompute_cart,
+    reset_cart,
+    upsert_cart_items,
+)
+from sqlalchemy import delete, select, update
 from sqlalchemy.exc import OperationalError
+from pydantic import ValidationError
 import time
 
 ns = Namespace("cart", description="Cart operations")
@@ -31,6 +42,20 @@ cart_item_update_model = ns.model(
     },
 )
 
+cart_operation_model = ns.model(
+    "CartItemOperation",
+    {
+        "op": fields.String(required=True, enum=["set", "add", "remove"], description="Operation"),
+        "book_id": fields.Integer(required=True, description="Book ID"),
+        "quantity": fields.Integer(description="Quantity to set or add", min=1),
+    },
+)
+
+cart_items_update_model = ns.model(
+    "CartItemsUpdate",
+    {"operations": fields.List(fields.Nested(cart_operation_model), required=True, description="Applied in order")},
+)
+
 cart_response_model = ns.model(
     "CartResponse",
     {
@@ -38,40 +63,28 @@ cart_response_model = ns.model(
         "user_id": fields.Integer(description="User ID"),
         "items": fields.List(fields.Nested(cart_item_model)),
         "total_price": fields.Float(description="Total cart price"),
+        "item_count": fields.Integer(description="Number of copies in the cart"),
         "created_at": fields.DateTime(description="Creation timestamp"),
         "updated_at": fields.DateTime(description="Last update timestamp"),
     },
 )
 
 
-def get_cart_response():
-    """Helper function to get cart response"""
-    with session_scope() as db:
-        cart = db.query(Cart).filter_by(user_id=current_user.id).first()
-        if not cart:
-            cart = Cart(user_id=current_user.id)
-            db.add(cart)
-            db.commit()
+def find_cart(db, create: bool = False):
+    """The current user's cart row (see CART_COLUMNS), created on first use when `create` is set"""
+    if create:
+        return get_or_create_cart(db, current_user.id)
+    return db.execute(select(*CART_COLUMNS).where(Cart.user_id == current_user.id)).one_or_none()
+
 
-        # Calculate total price
-        total_price = (
-            db.query(func.sum(Book.price * CartItem.quantity))
-            .join(CartItem, Book.id == CartItem.book_id)
-            .filter(CartItem.cart_id == cart.id)
-            .scalar()
-            or 0.0
-        )
-
-        # Create response dictionary before closing session
-        response = {
-            "id": cart.id,
-            "user_id": cart.user_id,
-            "items": [{"book_id": item.book_id, "quantity": item.quantity} for item in cart.items],
-            "total_price": total_price,
-            "created_at": cart.created_at,
-            "updated_at": cart.updated_at,
-        }
-        return response
+def find_cart_item(db, cart_id: int, book_id: int):
+    """(item id, quantity, book price) of a book in a cart, or None; the line stays locked until commit"""
+    return db.execute(
+        select(CartItem.id, CartItem.quantity, Book.price)
+        .join(Book, Book.id == CartItem.book_id)
+        .where(CartItem.cart_id == cart_id, CartItem.book_id == book_id)
+        .with_for_update(of=CartItem)
+    ).one_or_none()
 
 
 @ns.route("")
@@ -82,7 +95,8 @@ class CartResource(Resource):
     @login_required
     def get(self):
         """Get current user's cart"""
-        return get_cart_response()
+        with session_scope() as db:
+            return cart_state(db, find_cart(db, create=True))
 
     @ns.doc("add_to_cart", description="Добавить товар в корзину.")
     @ns.expect(cart_item_model)
@@ -94,28 +108,13 @@ class CartResource(Resource):
             data = CartItemCreate(**request.json)
 
             # Check if book exists
-            book = db.query(Book).get(data.book_id)
-            if not book:
+            price = db.execute(select(Book.price).where(Book.id == data.book_id)).scalar()
+            if price is None:
                 return {"message": "Book not found"}, HTTPStatus.NOT_FOUND
 
-            # Get or create cart
-            cart = db.query(Cart).filter_by(user_id=current_user.id).first()
-            if not cart:
-                cart = Cart(user_id=current_user.id)
-                db.add(cart)
-                db.commit()
-
-            # Check if item already in cart
-            cart_item = db.query(CartItem).filter_by(cart_id=cart.id, book_id=data.book_id).first()
-
-            if cart_item:
-                cart_item.quantity += data.quantity
-            else:
-                cart_item = CartItem(cart_id=cart.id, book_id=data.book_id, quantity=data.quantity)
-                db.add(cart_item)
-
-            db.commit()
-            return get_cart_response()
+            cart = find_cart(db, create=True)
+            upsert_cart_items(db, cart.id, {data.book_id: data.quantity})
+            return cart_state(db, apply_cart_delta(db, cart.id, data.quantity, price * data.quantity))
 
     @ns.doc("clear_cart", description="Очистить корзину пользователя.")
     @ns.marshal_with(cart_response_model)
@@ -123,14 +122,13 @@ class CartResource(Resource):
     def delete(self):
         """Clear the entire cart"""
         with session_scope() as db:
-            cart = db.query(Cart).filter_by(user_id=current_user.id).first()
+            cart = find_cart(db)
             if not cart:
                 return {"message": "Cart not found"}, HTTPStatus.NOT_FOUND
 
             # Delete all cart items
             db.query(CartItem).filter_by(cart_id=cart.id).delete()
-            db.commit()
-            return get_cart_response()
+            return cart_state(db, reset_cart(db, cart.id))
 
     @ns.doc("make_an_order", description="Оформить заказ из корзины пользователя.")
     @ns.expect(
@@ -143,48 +141,91 @@ class CartResource(Resource):
             if not request.json or "shipping_address" not in request.json:
                 return {"message": "Shipping address is required"}, HTTPStatus.BAD_REQUEST
 
-            cart = db.query(Cart).filter_by(user_id=current_user.id).first()
+            # Lock the cart so a concurrent checkout of it waits and then finds it empty
+            cart = db.execute(
+                select(*CART_COLUMNS).where(Cart.user_id == current_user.id).with_for_update()
+            ).one_or_none()
             if not cart:
                 return {"message": "Cart not found"}, HTTPStatus.NOT_FOUND
 
-            if not cart.items:
-                return {"message": "Cart is empty"}, HTTPStatus.BAD_REQUEST
-
-            # Calculate total amount
-            total_amount = (
-                db.query(func.sum(Book.price * CartItem.quantity))
-                .join(CartItem, Book.id == CartItem.book_id)
-                .filter(CartItem.cart_id == cart.id)
-                .scalar()
-                or 0.0
-            )
-
-            # Create order
             order = Order(
                 user_id=current_user.id,
                 status=OrderStatus.PENDING,
-                total_amount=total_amount,
+                total_amount=0.0,
                 shipping_address=request.json["shipping_address"],
             )
             db.add(order)
             db.flush()  # Get order ID
 
-            # Create order items from cart items
-            for cart_item in cart.items:
-                book = db.query(Book).get(cart_item.book_id)
-                if book:  # Add check to prevent None access
-                    order_item = OrderItem(
-                        order_id=order.id, book_id=cart_item.book_id, quantity=cart_item.quantity, price=book.price
-                    )
-                    db.add(order_item)
-
-            # Clear the cart
-            db.query(CartItem).filter_by(cart_id=cart.id).delete()
+            lines = move_cart_to_order(db, cart.id, order.id)
+            if not lines:
+                db.rollback()
+                return {"message": "Cart is empty"}, HTTPStatus.BAD_REQUEST
+            # The total comes from the very prices written to the order lines
+            order.total_amount = sum(price * quantity for _, quantity, price in lines)
 
             db.commit()
             return {"message": "Order created successfully", "order_id": order.id}, HTTPStatus.CREATED
 
 
+def collapse_operations(operations) -> tuple:
+    """
+    Reduce operations applied in order to at most one write per book:
+    ({book_id: quantity to add}, {book_id: quantity to set}, {book_ids to remove})
+    """
+    final = {}  # book_id -> (op, quantity)
+    for operation in operations:
+        previous = final.get(operation.book_id)
+        if operation.op is CartOperation.ADD and previous is not None:
+            if previous[0] is CartOperation.REMOVE:
+                final[operation.book_id] = (CartOperation.SET, operation.quantity)
+            else:
+                final[operation.book_id] = (previous[0], previous[1] + operation.quantity)
+        else:
+            final[operation.book_id] = (operation.op, operation.quantity)
+    adds = {book_id: quantity for book_id, (op, quantity) in final.items() if op is CartOperation.ADD}
+    sets = {book_id: quantity for book_id, (op, quantity) in final.items() if op is CartOperation.SET}
+    removes = {book_id for book_id, (op, _) in final.items() if op is CartOperation.REMOVE}
+    return adds, sets, removes
+
+
+@ns.route("/items")
+class CartItemsResource(Resource):
+
+    @ns.doc("update_cart_items", description="Изменить несколько товаров в корзине одним запросом.")
+    @ns.expect(cart_items_update_model)
+    @ns.response(200, "The updated cart", cart_response_model)
+    @login_required
+    def patch(self):
+        """Apply set/add/remove operations to the cart in one transaction"""
+        payload = request.json
+        if not isinstance(payload, dict):
+            return {"message": "Expected a JSON object with a list of operations"}, HTTPStatus.BAD_REQUEST
+        try:
+            data = CartItemsUpdate(**payload)
+        except ValidationError as e:
+            # The shape of the app's pydantic handler, which flask-restx resources never reach
+            details = e.errors(include_url=False, include_context=False)
+            return {"error": "Validation error", "details": details}, HTTPStatus.BAD_REQUEST
+        with session_scope() as db:
+            adds, sets, removes = collapse_operations(data.operations)
+
+            # Validate all books at once
+            book_ids = {operation.book_id for operation in data.operations}
+            found = set(db.execute(select(Book.id).where(Book.id.in_(book_ids))).scalars())
+            if book_ids - found:
+                missing = ", ".join(str(book_id) for book_id in sorted(book_ids - found))
+                return {"message": f"Books not found: {missing}"}, HTTPStatus.NOT_FOUND
+
+            cart = find_cart(db, create=True)
+            if removes:
+                db.execute(delete(CartItem).where(CartItem.cart_id == cart.id, CartItem.book_id.in_(removes)))
+            upsert_cart_items(db, cart.id, adds)
+            upsert_cart_items(db, cart.id, sets, increment=False)
+            # Marshalled here rather than with marshal_with, which would also marshal the error bodies above
+            return ns.marshal(cart_state(db, recompute_cart(db, cart.id)), cart_response_model)
+
+
 @ns.route("/items/<int:book_id>")
 class CartItemResource(Resource):
 
@@ -197,18 +238,18 @@ class CartItemResource(Resource):
         with session_scope() as db:
             data = CartItemCreate(quantity=request.json["quantity"], book_id=book_id)
 
-            cart = db.query(Cart).filter_by(user_id=current_user.id).first()
+            cart = find_cart(db)
             if not cart:
                 return {"message": "Cart not found"}, HTTPStatus.NOT_FOUND
 
-            cart_item = db.query(CartItem).filter_by(cart_id=cart.id, book_id=book_id).first()
+            cart_item = find_cart_item(db, cart.id, book_id)
 
             if not cart_item:
                 return {"message": "Item not found in cart"}, HTTPStatus.NOT_FOUND
 
-            cart_item.quantity = data.quantity
-            db.commit()
-            return get_cart_response()
+            db.execute(update(CartItem).where(CartItem.id == cart_item.id).values(quantity=data.quantity))
+            delta = data.quantity - cart_item.quantity
+            return cart_state(db, apply_cart_delta(db, cart.id, delta, cart_item.price * delta))
 
     @ns.doc("remove_from_cart", description="Удалить товар из корзины по book_id.")
     @ns.marshal_with(cart_response_model)
@@ -216,15 +257,20 @@ class CartItemResource(Resource):
     def delete(self, book_id):
         """Remove item from cart"""
         with session_scope() as db:
-            cart = db.query(Cart).filter_by(user_id=current_user.id).first()
+            cart = find_cart(db)
             if not cart:
                 return {"message": "Cart not found"}, HTTPStatus.NOT_FOUND
 
-            cart_item = db.query(CartItem).filter_by(cart_id=cart.id, book_id=book_id).first()
-
-            if not cart_item:
+            # The DELETE returns the quantity it removed, so an add racing with it cannot skew the totals
+            quantity = db.execute(
+                delete(CartItem)
+                .where(CartItem.cart_id == cart.id, CartItem.book_id == book_id)
+                .returning(CartItem.quantity)
+                .execution_options(synchronize_session=False)
+            ).scalar()
+            if quantity is None:
                 return {"message": "Item not found in cart"}, HTTPStatus.NOT_FOUND
 
-            db.delete(cart_item)
-            db.commit()
-            return get_cart_response()
+            # A line left behind by a deleted book has no price any more; repair-carts settles its total
+            price = db.execute(select(Book.price).where(Book.id == book_id)).scalar() or 0.0
+            return cart_state(db, apply_cart_delta(db, cart.id, -quantity, -price * quantity))
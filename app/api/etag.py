@@ -0,0 +1,39 @@
+import hashlib
+from functools import wraps
+
+from flask import Response, after_this_request, g, request
+
+from app.compression import cached_response
+from db.versions import CATALOG, current_version
+
+
+def catalog_etag(view):
+    """
+    Tag a GET handler's response with a strong ETag derived from the catalog version and the URL.
+    A request whose If-None-Match still matches gets 304 before the handler, the ORM or the
+    serializer run; the only query is the version lookup. Otherwise a compressed body cached
+    under the same version is replayed (see app/compression.py).
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = current_version(CATALOG)
+        etag = hashlib.sha1(f"{version}:{request.full_path}".encode("utf-8")).hexdigest()[:20]
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+        cached = cached_response(version)
+        if cached is not None:
+            return cached
+        g.catalog_version = version
+
+        @after_this_request
+        def add_etag(response):
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+
+        return view(*args, **kwargs)
+
+    return wrapper
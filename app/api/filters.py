@@ -0,0 +1,140 @@
+"""
+Server-side filtering, sorting and facet counts for the book catalog.
+Every filter and sort key is backed by a composite index declared on Book.
+"""
+
+from flask_restx import abort
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Query, Session
+
+from app.api.pagination import decode_cursor
+from db.models import Book, Genre
+
+# ?param= -> (column, comparison, type)
+FILTERS = {
+    "price_min": (Book.price, "ge", float),
+    "price_max": (Book.price, "le", float),
+    "year_from": (Book.year, "ge", int),
+    "year_to": (Book.year, "le", int),
+    "genre_id": (Book.genre_id, "eq", int),
+    "rating_min": (Book.rating, "ge", float),
+}
+
+# Facet name -> filters ignored while counting it, so a client sees every alternative for that dimension
+FACETS = {
+    "genre": ("genre_id",),
+    "price": ("price_min", "price_max"),
+    "year": ("year_from", "year_to"),
+}
+
+SORT_COLUMNS = {"id": Book.id, "price": Book.price, "year": Book.year, "rating": Book.rating}
+
+DEFAULT_PRICE_BUCKET = 500
+DEFAULT_YEAR_BUCKET = 10
+
+
+def _arg(args, name: str, cast):
+    value = args.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        abort(400, message=f"{name} must be a number")
+
+
+def apply_filters(query: Query, args, exclude: tuple = ()) -> Query:
+    """Apply the FILTERS present in args, skipping the names in exclude"""
+    for name, (column, comparison, cast) in FILTERS.items():
+        if name in exclude:
+            continue
+        value = _arg(args, name, cast)
+        if value is None:
+            continue
+        if comparison == "ge":
+            query = query.filter(column >= value)
+        elif comparison == "le":
+            query = query.filter(column <= value)
+        else:
+            query = query.filter(column == value)
+    return query
+
+
+def parse_sort(args) -> tuple:
+    """Return (sort name, column, descending) for ?sort=price / ?sort=-rating; defaults to id"""
+    sort = args.get("sort") or "id"
+    name = sort.lstrip("-")
+    if name not in SORT_COLUMNS:
+        abort(400, message=f"sort must be one of: {', '.join(SORT_COLUMNS)} (prefix with - for descending)")
+    return sort, SORT_COLUMNS[name], sort.startswith("-")
+
+
+def sort_columns(args) -> tuple:
+    """Columns apply_sort needs loaded besides id, for load_only projections"""
+    _, column, _ = parse_sort(args)
+    return () if column is Book.id else (column,)
+
+
+def apply_sort(query: Query, args) -> tuple:
+    """
+    Order the query by ?sort= with id as a tie-breaker and continue after ?cursor= if given.
+    Returns the query and a function building the cursor from the last book of a page.
+    """
+    sort, column, descending = parse_sort(args)
+    keys = (Book.id,) if column is Book.id else (column, Book.id)
+    query = query.order_by(*[key.desc() for key in keys] if descending else keys)
+
+    cursor = args.get("cursor")
+    if cursor:
+        values = decode_cursor(cursor)
+        if values.get("sort", "id") != sort or "id" not in values:
+            abort(400, message="Cursor does not match the requested sort")
+        try:
+            book_id = int(values["id"])
+            bound = (book_id,) if column is Book.id else (column.type.python_type(values["value"]), book_id)
+        except (KeyError, TypeError, ValueError):
+            abort(400, message="Invalid cursor")
+        if descending:
+            query = query.filter(tuple_(*keys) < tuple_(*bound))
+        else:
+            query = query.filter(tuple_(*keys) > tuple_(*bound))
+
+    def cursor_key(book: Book) -> dict:
+        values = {"sort": sort, "id": book.id}
+        if column is not Book.id:
+            values["value"] = getattr(book, column.key)
+        return values
+
+    return query, cursor_key
+
+
+def book_facets(db: Session, args, names) -> dict:
+    """Counts per genre and price/year histograms over the books matching the other filters"""
+    facets = {}
+    for name in names:
+        if name not in FACETS:
+            abort(400, message=f"facets must be a subset of: {', '.join(FACETS)}")
+        exclude = FACETS[name]
+        if name == "genre":
+            query = (
+                db.query(Genre.id, Genre.name, func.count(Book.id))
+                .join(Book, Book.genre_id == Genre.id)
+                .group_by(Genre.id, Genre.name)
+                .order_by(func.count(Book.id).desc())
+            )
+            rows = apply_filters(query, args, exclude).all()
+            facets[name] = [{"id": genre_id, "name": genre, "count": count} for genre_id, genre, count in rows]
+        else:
+            if name == "price":
+                width = _arg(args, "price_bucket", float)
+                width = DEFAULT_PRICE_BUCKET if width is None else width
+            else:
+                width = _arg(args, "year_bucket", int)
+                width = DEFAULT_YEAR_BUCKET if width is None else width
+            if width <= 0:
+                abort(400, message=f"{name}_bucket must be positive")
+            bucket = func.floor(Book.price / width) * width if name == "price" else (Book.year // width) * width
+            query = db.query(bucket.label("bucket"), func.count(Book.id)).group_by("bucket").order_by("bucket")
+            rows = apply_filters(query, args, exclude).all()
+            facets[name] = [{"from": start, "to": start + width, "count": count} for start, count in rows]
+    return facets
@@ -1,8 +1,12 @@
 from flask_restx import Resource, fields, Namespace
 from flask import request
 from db.database import get_db
-from db.models import Genre
+from db.models import Book, Genre
 from sqlalchemy.exc import IntegrityError
+from db.carts import remove_book_from_carts
+from db.changes import record_deletions
+from db.versions import bump_version
+from app.api.etag import catalog_etag
 
 # Create namespace
 ns = Namespace("genres", description="Genre operations")
@@ -20,6 +24,8 @@ genre_model = ns.model(
 @ns.route("/")
 class GenreList(Resource):
     @ns.doc("list_genres")
+    @ns.response(304, "Not modified since the ETag in If-None-Match")
+    @catalog_etag
     @ns.marshal_list_with(genre_model)
     def get(self):
         """List all genres"""
@@ -36,6 +42,7 @@ class GenreList(Resource):
         try:
             genre = Genre(name=request.json["name"])
             db.add(genre)
+            bump_version(db)
             db.commit()
             db.refresh(genre)
             return genre, 201
@@ -71,6 +78,7 @@ class GenreResource(Resource):
 
         try:
             genre.name = request.json["name"]
+            bump_version(db)
             db.commit()
             return genre
         except IntegrityError:
@@ -90,7 +98,12 @@ class GenreResource(Resource):
             ns.abort(404, message=f"Genre {id} not found")
 
         try:
+            # Books go with their genre; leave tombstones for the in-memory indexes and empty them from carts
+            books = db.query(Book.id, Book.price).filter(Book.genre_id == genre.id).all()
+            for book_id, price in books:
+                remove_book_from_carts(db, book_id, price)
             db.delete(genre)
+            record_deletions(db, [book_id for book_id, _ in books], bump_version(db))
             db.commit()
             return "", 204
         except Exception as e:
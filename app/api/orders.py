@@ -3,7 +3,8 @@ from flask import request, jsonify
 from app.api import api
 from db.database import get_db
 from db.models import Order, OrderItem, Book
-from app.schemas import OrderCreate, OrderResponse, OrderUpdate
+from app.api.serializers import order_query, serialize_order
+from app.schemas import OrderCreate, OrderUpdate
 from flask_login import login_required, current_user
 from sqlalchemy.exc import SQLAlchemyError
 from http import HTTPStatus
@@ -41,17 +42,17 @@ order_model = api.model(
 class OrderList(Resource):
     @login_required
     @ns.doc("list_orders")
-    @ns.marshal_list_with(order_model)
+    @ns.response(200, "Success", [order_model])
     def get(self):
         """List all orders for the current user"""
         db = get_db()
-        orders = db.query(Order).filter(Order.user_id == current_user.id).all()
-        return [OrderResponse.from_orm(order).dict() for order in orders]
+        orders = order_query(db).filter(Order.user_id == current_user.id).all()
+        return [serialize_order(order) for order in orders]
 
     @login_required
     @ns.doc("create_order")
     @ns.expect(order_model)
-    @ns.marshal_with(order_model, code=201)
+    @ns.response(201, "Order created", order_model)
     def post(self):
         """Create a new order"""
         try:
@@ -86,7 +87,7 @@ class OrderList(Resource):
                 db.add(order_item)
 
             db.commit()
-            return OrderResponse.from_orm(order).dict(), 201
+            return serialize_order(order), 201
 
         except SQLAlchemyError as e:
             db.rollback()
@@ -97,19 +98,19 @@ class OrderList(Resource):
 class OrderResource(Resource):
     @login_required
     @ns.doc("get_order")
-    @ns.marshal_with(order_model)
+    @ns.response(200, "Success", order_model)
     def get(self, id):
         """Get an order by ID"""
         db = get_db()
-        order = db.query(Order).filter(Order.id == id, Order.user_id == current_user.id).first()
+        order = order_query(db).filter(Order.id == id, Order.user_id == current_user.id).first()
         if not order:
             return {"error": "Order not found"}, 404
-        return OrderResponse.from_orm(order).dict()
+        return serialize_order(order)
 
     @login_required
     @ns.doc("update_order")
     @ns.expect(order_model)
-    @ns.marshal_with(order_model)
+    @ns.response(200, "Success", order_model)
     def put(self, id):
         """Update an order (only status and shipping address can be updated)"""
         db = get_db()
@@ -125,7 +126,7 @@ class OrderResource(Resource):
                 order.shipping_address = update_data.shipping_address
 
             db.commit()
-            return OrderResponse.from_orm(order).dict()
+            return serialize_order(order)
 
         except SQLAlchemyError as e:
             db.rollback()
@@ -0,0 +1,54 @@
+import base64
+import binascii
+import json
+
+from flask_restx import abort
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def parse_limit(value, default: int = DEFAULT_PAGE_SIZE, maximum: int = MAX_PAGE_SIZE) -> int:
+    """Parse ?limit= and clamp it to [1, maximum]"""
+    if value is None or value == "":
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        abort(400, message="limit must be an integer")
+    return max(1, min(limit, maximum))
+
+
+def encode_cursor(values: dict) -> str:
+    """Pack the sort key of the last row into an opaque url-safe token"""
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    """Unpack a token produced by encode_cursor, aborting with 400 on garbage"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        abort(400, message="Invalid cursor")
+    if not isinstance(values, dict):
+        abort(400, message="Invalid cursor")
+    return values
+
+
+def paginate(rows: list, limit: int, key) -> tuple:
+    """
+    Split a result fetched with LIMIT limit + 1 into the page and the next cursor.
+    `key` maps the last row of the page to the values stored in the cursor.
+    """
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(key(rows[-1]))
+    return rows, None
+
+
+def pagination_headers(limit: int, next_cursor) -> dict:
+    """Page metadata for the X-Pagination response header"""
+    meta = {"limit": limit, "next_cursor": next_cursor, "has_more": next_cursor is not None}
+    return {"X-Pagination": json.dumps(meta)}
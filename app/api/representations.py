@@ -0,0 +1,63 @@
+"""
+JSON representation for the flask-restx Api. orjson (native datetime, UUID and dataclass support,
+UTF-8 output without \\u escapes) when installed, the standard library otherwise.
+Select with settings.JSON_ENCODER, or plug in another encoder with set_json_encoder().
+"""
+
+import json
+from datetime import date, datetime
+from uuid import UUID
+
+from flask import current_app, make_response
+
+from config import settings
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def stdlib_dumps(data) -> bytes:
+    indent = 4 if current_app.debug else None
+    return (json.dumps(data, ensure_ascii=False, indent=indent, default=_default) + "\n").encode("utf-8")
+
+
+def orjson_dumps(data) -> bytes:
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+    if current_app.debug:
+        option |= orjson.OPT_INDENT_2
+    try:
+        return orjson.dumps(data, option=option)
+    except orjson.JSONEncodeError:
+        # e.g. integers beyond 64 bits or Decimal
+        return stdlib_dumps(data)
+
+
+ENCODERS = {"json": stdlib_dumps}
+if orjson is not None:
+    ENCODERS["orjson"] = orjson_dumps
+
+_dumps = ENCODERS.get(settings.JSON_ENCODER, stdlib_dumps)
+
+
+def set_json_encoder(dumps) -> None:
+    """Use `dumps(data) -> bytes` (or a name from ENCODERS) for every application/json response"""
+    global _dumps
+    _dumps = ENCODERS[dumps] if isinstance(dumps, str) else dumps
+
+
+def output_json(data, code, headers=None):
+    """Makes a Flask response with a JSON encoded body"""
+    response = make_response(_dumps(data), code)
+    response.headers.extend(headers or {})
+    response.mimetype = "application/json"
+    return response
@@ -0,0 +1,115 @@
+"""
+Single-pass serializers: ORM row -> response dict with datetimes already in ISO 8601.
+The *_query helpers eager-load the relationships the serializers touch.
+"""
+
+from flask_restx import abort
+from sqlalchemy.orm import Query, Session, joinedload, load_only, selectinload
+
+from db.models import Book, Genre, Order, Review
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+# ?fields= name -> getter, used when a client asks for a subset of the book
+BOOK_FIELDS = {
+    "id": lambda book: book.id,
+    "title": lambda book: book.title,
+    "author": lambda book: book.author,
+    "price": lambda book: float(book.price),
+    "genre": lambda book: book.genre.name if book.genre is not None else "",
+    "cover": lambda book: book.cover,
+    "description": lambda book: book.description,
+    "rating": lambda book: float(book.rating) if book.rating is not None else 0.0,
+    "year": lambda book: book.year,
+    "created_at": lambda book: _isoformat(book.created_at),
+    "updated_at": lambda book: _isoformat(book.updated_at),
+}
+
+
+def parse_fields(value) -> tuple:
+    """Parse ?fields=id,title,price; None means every field"""
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(",") if name.strip()))
+    if not fields or any(name not in BOOK_FIELDS for name in fields):
+        abort(400, message=f"fields must be a subset of: {', '.join(BOOK_FIELDS)}")
+    return fields
+
+
+def project(item: dict, fields) -> dict:
+    """Subset an already serialized book"""
+    return item if fields is None else {name: item[name] for name in fields}
+
+
+def serialize_book(book: Book, fields: tuple = None) -> dict:
+    if fields is not None:
+        return {name: BOOK_FIELDS[name](book) for name in fields}
+    genre = book.genre
+    return {
+        "id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "price": float(book.price),
+        "genre": genre.name if genre is not None else "",
+        "cover": book.cover,
+        "description": book.description,
+        "rating": float(book.rating) if book.rating is not None else 0.0,
+        "year": book.year,
+        "created_at": _isoformat(book.created_at),
+        "updated_at": _isoformat(book.updated_at),
+    }
+
+
+def serialize_review(review: Review) -> dict:
+    return {
+        "id": review.id,
+        "user_id": review.user_id,
+        "username": review.user.username,
+        "rating": float(review.rating),
+        "comment": review.comment or None,
+        "created_at": _isoformat(review.created_at),
+    }
+
+
+def serialize_order(order: Order) -> dict:
+    return {
+        "id": order.id,
+        "user_id": order.user_id,
+        "status": order.status.value if order.status is not None else None,
+        "total_amount": float(order.total_amount),
+        "shipping_address": order.shipping_address,
+        "created_at": _isoformat(order.created_at),
+        "updated_at": _isoformat(order.updated_at),
+        "items": [
+            {"book_id": item.book_id, "quantity": item.quantity, "price": float(item.price)} for item in order.items
+        ],
+    }
+
+
+def book_query(db: Session, fields: tuple = None, also: tuple = ()) -> Query:
+    """
+    Books with their genre joined in the same SELECT. With `fields` only those columns (plus the
+    columns in `also`, e.g. a sort key) are selected, and the genre is joined only when asked for.
+    """
+    if fields is None:
+        return db.query(Book).options(joinedload(Book.genre))
+    columns = [getattr(Book, name) for name in fields if name not in ("id", "genre")]
+    options = []
+    if "genre" in fields:
+        columns.append(Book.genre_id)
+        options.append(joinedload(Book.genre).load_only(Genre.name))
+    options.append(load_only(*columns, *also) if columns or also else load_only(Book.id))
+    return db.query(Book).options(*options)
+
+
+def review_query(db: Session) -> Query:
+    """Reviews with the authors of the whole page loaded by one extra IN query"""
+    return db.query(Review).options(selectinload(Review.user))
+
+
+def order_query(db: Session) -> Query:
+    """Orders with all their items loaded by one extra IN query"""
+    return db.query(Order).options(selectinload(Order.items))
@@ -0,0 +1,49 @@
+import time
+
+import click
+
+from db.carts import repair_carts
+from db.database import get_db
+from db.importer import FORMATS, detect_format, import_books
+from db.migrator import run_migrations
+from db.ratings import repair_ratings
+
+
+@click.command("repair-ratings")
+def repair_ratings_command():
+    """Recompute review_count, rating_sum, rating and score of all books from the reviews table"""
+    updated = repair_ratings(get_db())
+    click.echo(f"Recomputed ratings of {updated} books")
+
+
+@click.command("repair-carts")
+def repair_carts_command():
+    """Recompute item_count and total_price of all carts from their items"""
+    updated = repair_carts(get_db())
+    click.echo(f"Recomputed totals of {updated} carts")
+
+
+@click.command("import-books")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(FORMATS), help="Defaults to the file extension")
+def import_books_command(path, fmt):
+    """Stream books from an NDJSON or CSV file into the catalog"""
+    with open(path, "rb") as stream:
+        report = import_books(get_db(), stream, fmt or detect_format(path)).to_dict()
+    for error in report["errors"]:
+        click.echo(f"line {error['line']}: {error['error']}")
+    click.echo(
+        f"Imported {report['imported']} books, {report['failed']} failed, {report['genres_created']} new genres "
+        f"in {report['seconds']} s ({report['rows_per_second']} rows/s)"
+    )
+
+
+@click.command("migrate")
+def migrate_command():
+    """Create or upgrade the schema and seed the catalog, holding a database lock so only one process does it"""
+    started = time.perf_counter()
+    run_migrations()
+    click.echo(f"Database migrated in {time.perf_counter() - started:.2f} s")
+
+
+commands = (repair_ratings_command, repair_carts_command, import_books_command, migrate_command)
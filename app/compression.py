@@ -0,0 +1,103 @@
+"""
+Negotiated response compression: zstd, brotli or gzip, whichever the client accepts and is installed.
+
+Responses of catalog_etag endpoints (/api/books/, /api/books/top, /api/genres/) are cacheable per
+catalog version, so their compressed bytes are kept in compressed_cache keyed by URL and encoding.
+catalog_etag replays a hit before the handler runs, so a hot response is serialized and compressed
+once per catalog version instead of once per request.
+"""
+
+import gzip
+
+from flask import Flask, Response, g, request
+
+from app.cache import VersionedLRUCache
+from config import settings
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+# Server preference when the client accepts several encodings with the same quality
+ENCODINGS = tuple(
+    name for name, available in (("zstd", zstandard), ("br", brotli), ("gzip", gzip)) if available is not None
+)
+COMPRESSIBLE = ("application/json", "application/x-ndjson", "text/csv", "text/html", "text/plain")
+# Headers replayed with a cached body
+CACHED_HEADERS = ("Content-Type", "ETag", "X-Pagination")
+
+compressed_cache = VersionedLRUCache(maxsize=settings.COMPRESS_CACHE_SIZE, ttl=settings.BOOK_CACHE_TTL)
+
+
+def negotiate() -> str:
+    """Best encoding for the request's Accept-Encoding, or None for identity"""
+    accepted = request.accept_encodings
+    best, best_quality = None, 0
+    for name in ENCODINGS:
+        quality = accepted[name]
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=settings.COMPRESS_ZSTD_LEVEL).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=settings.COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=settings.COMPRESS_GZIP_LEVEL)
+
+
+def cached_response(version: int):
+    """The compressed response stored for this URL and encoding under `version`, if any"""
+    encoding = negotiate()
+    if encoding is None:
+        return None
+    cached = compressed_cache.get((request.full_path, encoding), version)
+    if cached is None:
+        return None
+    body, headers = cached
+    response = Response(body, headers=headers)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def compress_response(response: Response) -> Response:
+    if (
+        response.status_code != 200
+        or response.is_streamed
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    encoding = negotiate()
+    if encoding is None or len(body) < settings.COMPRESS_MIN_SIZE:
+        return response
+
+    # The compressed body is no longer byte-identical to the one the strong ETag was computed for
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    body = compress(body, encoding)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+
+    version = g.get("catalog_version")
+    if version is not None:
+        headers = [(name, response.headers[name]) for name in CACHED_HEADERS if name in response.headers]
+        compressed_cache.set((request.full_path, encoding), (body, headers), version)
+    return response
+
+
+def init_app(app: Flask) -> None:
+    app.after_request(compress_response)
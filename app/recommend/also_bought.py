@@ -0,0 +1,143 @@
+"""
+"Bought together" recommendations from order history.
+
+The order x book incidence matrix X is built with one vectorized pass over order_items and the
+book x book co-occurrence matrix is C = X.T @ X without its diagonal, kept in CSR so a book's
+neighbours are one contiguous slice. Top-k is an argpartition over that slice.
+
+Each worker builds the matrix in a background thread, started at boot (app/warmup.py); until the
+first build is done the endpoint answers 503. The index follows app/search/sync.py with the largest
+order_items id as its version: every lookup reads the lines added since, from any worker, into a small
+delta merged into the answer, and the matrix is rebuilt in the background every
+ALSO_BOUGHT_REBUILD_INTERVAL seconds or once the delta passes INDEX_FOLD_IN_LIMIT lines. Ids are
+handed out before commit, so an order committed after a later one is only counted by the next rebuild.
+
+numpy and scipy are imported inside the methods that use them: loading them costs every process,
+CLI commands included, about 400 ms at startup, and most never build the matrix.
+"""
+
+import time
+from collections import Counter, defaultdict
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.search.sync import CatalogIndex
+from config import settings
+from db.database import get_engine
+from db.models import OrderItem
+
+
+class CoOccurrence(CatalogIndex):
+    def __init__(self):
+        super().__init__()
+        self.built_at = None
+        self._book_ids = None  # column index -> book id, a sorted numpy array once built
+        self._matrix = None  # scipy CSR co-occurrence counts once built
+        self._delta = defaultdict(Counter)  # book id -> Counter of co-bought book ids since the build
+        self._delta_lines = 0
+
+    def build(self, pairs) -> None:
+        """(Re)build from an (n, 2) numpy array of (order_id, book_id) rows"""
+        import numpy as np
+        import scipy.sparse as sp
+
+        pairs = np.unique(pairs, axis=0)  # a book counts once per order whatever the quantity
+        orders, order_index = np.unique(pairs[:, 0], return_inverse=True)
+        book_ids, book_index = np.unique(pairs[:, 1], return_inverse=True)
+        incidence = sp.csr_matrix(
+            (np.ones(len(pairs), dtype=np.int32), (order_index.ravel(), book_index.ravel())),
+            shape=(len(orders), len(book_ids)),
+        )
+        matrix = (incidence.T @ incidence).tocsr()
+        matrix.setdiag(0)
+        matrix.eliminate_zeros()
+        with self._lock:
+            self._book_ids, self._matrix = book_ids, matrix
+            self._delta, self._delta_lines = defaultdict(Counter), 0
+            self.built = True
+            self.built_at = time.time()
+
+    def build_from_db(self, db: Session) -> None:
+        import numpy as np
+
+        rows = np.array(db.execute(select(OrderItem.id, OrderItem.order_id, OrderItem.book_id)).all(), dtype=np.int64)
+        rows = rows.reshape(-1, 3)
+        self.build(rows[:, 1:])
+        # The lines read are the version: the next sync counts exactly the ones added after them
+        self.version = int(rows[:, 0].max()) if len(rows) else 0
+
+    def _current_version(self) -> int:
+        with get_engine().connect() as connection:
+            return connection.execute(select(func.max(OrderItem.id))).scalar() or 0
+
+    def _deleted(self, db: Session, since: int) -> list:
+        return []
+
+    def _fold_in_limit(self) -> int:
+        return max(0, settings.INDEX_FOLD_IN_LIMIT - self._delta_lines)
+
+    def _changed(self, db: Session, since: int, until: int, limit: int):
+        query = select(OrderItem.order_id, OrderItem.book_id).where(OrderItem.id > since, OrderItem.id <= until)
+        rows = db.execute(query.limit(limit + 1)).all()
+        return None if len(rows) > limit else rows
+
+    def _apply(self, rows, deleted) -> None:
+        orders = defaultdict(set)
+        for order_id, book_id in rows:
+            orders[order_id].add(book_id)
+        for book_ids in orders.values():
+            for book_id in book_ids:
+                self._delta[book_id].update(other for other in book_ids if other != book_id)
+        self._delta_lines += len(rows)
+
+    def top(self, book_id: int, limit: int = 10) -> list:
+        """[(book_id, times bought together)] best first"""
+        import numpy as np
+
+        with self._lock:
+            book_ids, matrix, delta = self._book_ids, self._matrix, self._delta.get(book_id)
+            delta = dict(delta) if delta else {}
+        if book_ids is None:
+            return []
+        position = np.searchsorted(book_ids, book_id)
+        if position < len(book_ids) and book_ids[position] == book_id:
+            start, end = matrix.indptr[position], matrix.indptr[position + 1]
+            neighbours, counts = book_ids[matrix.indices[start:end]], matrix.data[start:end]
+        else:
+            neighbours, counts = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+        if delta:
+            counts = counts.astype(np.int64)
+            known = dict(zip(neighbours.tolist(), range(len(neighbours))))
+            extra_ids, extra_counts = [], []
+            for other, count in delta.items():
+                if other in known:
+                    counts[known[other]] += count
+                else:
+                    extra_ids.append(other)
+                    extra_counts.append(count)
+            neighbours = np.concatenate([neighbours, np.array(extra_ids, dtype=np.int64)])
+            counts = np.concatenate([counts, np.array(extra_counts, dtype=np.int64)])
+        if len(counts) > limit:
+            best = np.argpartition(-counts, limit - 1)[:limit]
+            neighbours, counts = neighbours[best], counts[best]
+        order = np.lexsort((neighbours, -counts))
+        return list(zip(neighbours[order].tolist(), counts[order].tolist()))
+
+    def is_stale(self) -> bool:
+        return self.built_at is not None and time.time() - self.built_at >= settings.ALSO_BOUGHT_REBUILD_INTERVAL
+
+
+also_bought = CoOccurrence()
+
+
+def get_also_bought(db: Session, db_factory):
+    """
+    The worker's matrix caught up with the orders placed since its build, or None while the first build
+    is running; rebuilt in the background once it is older than the interval
+    """
+    if not also_bought.sync(db, db_factory):
+        return None
+    if also_bought.is_stale():
+        also_bought.build_in_background(db_factory)
+    return also_bought
@@ -0,0 +1,248 @@
+"""
+Content-based "similar books": cosine similarity of hashed TF-IDF vectors.
+
+Title, author and description are tokenized and stemmed like the full-text index, weighted per field
+and hashed into DIMENSIONS columns, so no vocabulary has to be stored or shared. The books x DIMENSIONS
+matrix gets sublinear tf, idf and L2-normalized rows, then neighbours of a book are one sparse
+matrix-vector product plus argpartition.
+
+The matrix is written as .npy files under SIMILAR_INDEX_DIR and memory-mapped, so gunicorn workers on
+a host share one copy of it in the page cache and only the first of them builds it (under a file lock
+where the platform has fcntl). Each build records the catalog version it was read at, and workers keep
+in step with the catalog like the full-text index does (app/search/sync.py): books whose text was
+written since (Book.text_version) are re-vectorized with the stored idf into a small in-memory overlay,
+deleted ones are masked out. Rating-only writes leave the vectors alone. Once the overlay would grow
+past SIMILAR_FOLD_IN_LIMIT books the files are rebuilt in a background thread while the old matrix
+keeps answering.
+
+numpy and scipy are imported inside the methods that use them, as in app/recommend/also_bought.py.
+"""
+
+import json
+import math
+import os
+import shutil
+import time
+import zlib
+from collections import Counter
+
+from sqlalchemy.orm import Session
+
+from app.search.fulltext import FIELD_WEIGHTS
+from app.search.stemmer import tokenize
+from app.search.sync import CatalogIndex
+from config import settings
+from db.changes import changed_books
+from db.models import Book
+from db.versions import current_version
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent first builds are not serialized, each writes its own generation
+    fcntl = None
+
+DIMENSIONS = 2**18
+ARRAYS = ("data", "indices", "indptr", "book_ids", "idf")
+
+
+def hashed_terms(title: str, author: str, description: str) -> Counter:
+    """Field-weighted term counts keyed by column; crc32 so every process hashes alike"""
+    counts = Counter()
+    for (_, weight), text in zip(FIELD_WEIGHTS, (title, author, description)):
+        for term in tokenize(text or ""):
+            counts[zlib.crc32(term.encode("utf-8")) % DIMENSIONS] += weight
+    return counts
+
+
+def normalize_rows(matrix) -> None:
+    """Scale every row of a scipy CSR matrix to unit length in place"""
+    import numpy as np
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    matrix.data /= np.repeat(norms, np.diff(matrix.indptr)).astype(np.float32)
+
+
+class SimilarityIndex(CatalogIndex):
+    def __init__(self):
+        super().__init__()
+        self._generation = None  # directory name of the loaded build
+        self._matrix = None  # scipy CSR matrix once loaded
+        self._book_ids = None  # row -> book id, an ascending numpy array once loaded
+        self._idf = None
+        self._overlay = {}  # book id -> (columns, weights) of books written after the build
+        self._removed = set()
+
+    @property
+    def _prefix(self) -> str:
+        # One set of files per database, so several apps on a host do not mix them up
+        return os.path.join(settings.SIMILAR_INDEX_DIR, f"similar-{zlib.crc32(settings.DATABASE_URL.encode()):08x}")
+
+    def _current_generation(self):
+        try:
+            with open(self._prefix + ".current") as pointer:
+                return pointer.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _meta(self, generation: str) -> dict:
+        with open(os.path.join(settings.SIMILAR_INDEX_DIR, generation, "meta.json")) as meta:
+            return json.load(meta)
+
+    def _reflects_catalog(self, generation: str) -> bool:
+        """False for files written by an older release or before the database was recreated"""
+        version = self._meta(generation).get("version")
+        return version is not None and version <= current_version()
+
+    def build(self, db: Session) -> str:
+        """Vectorize the whole books table into a new generation of files and make it current"""
+        import numpy as np
+        import scipy.sparse as sp
+
+        # Read the version first: books written during the scan are folded in again by the next sync
+        version = current_version()
+        indptr, indices, counts, book_ids = [0], [], [], []
+        query = db.query(Book.id, Book.title, Book.author, Book.description).order_by(Book.id)
+        for book_id, title, author, description in query.yield_per(5000):
+            terms = hashed_terms(title, author, description)
+            indices.extend(terms.keys())
+            counts.extend(terms.values())
+            indptr.append(len(indices))
+            book_ids.append(book_id)
+
+        indices = np.array(indices, dtype=np.int32)
+        document_frequency = np.bincount(indices, minlength=DIMENSIONS)
+        idf = (np.log((1 + len(book_ids)) / (1 + document_frequency)) + 1).astype(np.float32)
+        data = (1 + np.log(np.array(counts, dtype=np.float32))) * idf[indices]
+        matrix = sp.csr_matrix(
+            (data, indices, np.array(indptr, dtype=np.int64)), shape=(len(book_ids), DIMENSIONS), dtype=np.float32
+        )
+        normalize_rows(matrix)
+
+        generation = f"{os.path.basename(self._prefix)}-{time.time_ns()}"
+        directory = os.path.join(settings.SIMILAR_INDEX_DIR, generation)
+        os.makedirs(directory)
+        arrays = (matrix.data, matrix.indices, matrix.indptr, np.array(book_ids, dtype=np.int64), idf)
+        for name, array in zip(ARRAYS, arrays):
+            np.save(os.path.join(directory, name + ".npy"), array)
+        with open(os.path.join(directory, "meta.json"), "w") as meta:
+            json.dump({"version": version}, meta)
+        with open(self._prefix + ".tmp", "w") as pointer:
+            pointer.write(generation)
+        os.replace(self._prefix + ".tmp", self._prefix + ".current")
+
+        # Workers still mapping an older generation keep its pages until they switch
+        for name in os.listdir(settings.SIMILAR_INDEX_DIR):
+            if name.startswith(os.path.basename(self._prefix) + "-") and name != generation:
+                shutil.rmtree(os.path.join(settings.SIMILAR_INDEX_DIR, name), ignore_errors=True)
+        return generation
+
+    def _build_locked(self, db: Session, stale=None) -> str:
+        """Build unless another process did it while we waited for the lock"""
+        os.makedirs(settings.SIMILAR_INDEX_DIR, exist_ok=True)
+        with open(self._prefix + ".lock", "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            generation = self._current_generation()
+            if generation is None or generation == stale or not self._reflects_catalog(generation):
+                generation = self.build(db)
+            return generation
+
+    def _load(self, generation: str) -> None:
+        import numpy as np
+        import scipy.sparse as sp
+
+        directory = os.path.join(settings.SIMILAR_INDEX_DIR, generation)
+        data, indices, indptr, book_ids, idf = (
+            np.load(os.path.join(directory, name + ".npy"), mmap_mode="r") for name in ARRAYS
+        )
+        self._matrix = sp.csr_matrix((data, indices, indptr), shape=(len(book_ids), DIMENSIONS), copy=False)
+        self._book_ids, self._idf = book_ids, idf
+        self._generation = generation
+        self.version = self._meta(generation)["version"]
+        self._overlay, self._removed = {}, set()
+        self.built = True
+
+    def build_from_db(self, db: Session) -> None:
+        """Load the current files, building them first if they are missing or this index made them stale"""
+        self._load(self._build_locked(db, stale=self._generation))
+
+    def _fresh(self) -> "SimilarityIndex":
+        # The fresh copy replaces the generation the live one has loaded, unless another worker already did
+        fresh = SimilarityIndex()
+        fresh._generation = self._generation
+        return fresh
+
+    def _fold_in_limit(self) -> int:
+        return max(0, settings.SIMILAR_FOLD_IN_LIMIT - len(self._overlay))
+
+    def _changed(self, db: Session, since: int, until: int, limit: int):
+        columns = (Book.id, Book.title, Book.author, Book.description)
+        return changed_books(db, since, until, columns, (Book.text_version,), limit)
+
+    def _apply(self, rows, deleted) -> None:
+        for book_id in deleted:
+            self._overlay.pop(book_id, None)
+            self._removed.add(book_id)
+        for book_id, title, author, description in rows:
+            self._overlay[book_id] = self._vectorize(title, author, description)
+            self._removed.discard(book_id)
+
+    def _vectorize(self, title: str, author: str, description: str):
+        """A book's normalized row under the loaded idf"""
+        import numpy as np
+
+        terms = hashed_terms(title, author, description)
+        columns = np.fromiter(terms.keys(), dtype=np.int64, count=len(terms))
+        weights = (1 + np.log(np.fromiter(terms.values(), dtype=np.float32, count=len(terms)))) * self._idf[columns]
+        norm = math.sqrt(float(weights @ weights)) or 1.0
+        return columns, weights / norm
+
+    def top(self, book_id: int, limit: int = 10) -> list:
+        """[(book_id, cosine similarity)] best first, excluding the book itself"""
+        import numpy as np
+
+        with self._lock:
+            matrix, book_ids, overlay, removed = self._matrix, self._book_ids, dict(self._overlay), set(self._removed)
+        if matrix is None:
+            return []
+        position = int(np.searchsorted(book_ids, book_id))
+        in_base = position < len(book_ids) and book_ids[position] == book_id
+        if book_id in overlay:
+            columns, weights = overlay[book_id]
+        elif in_base and book_id not in removed:
+            start, end = matrix.indptr[position], matrix.indptr[position + 1]
+            columns, weights = matrix.indices[start:end], matrix.data[start:end]
+        else:
+            return []
+
+        query = np.zeros(DIMENSIONS, dtype=np.float32)
+        query[columns] = weights
+        scores = matrix @ query
+        # Rows of rewritten or deleted books are stale; rewritten ones are scored from the overlay below
+        stale = np.fromiter(set(overlay) | removed | {book_id}, dtype=np.int64)
+        if len(book_ids):
+            positions = np.minimum(np.searchsorted(book_ids, stale), len(book_ids) - 1)
+            scores[positions[book_ids[positions] == stale]] = 0
+        candidates = book_ids
+        others = [other for other in overlay if other != book_id]
+        if others:
+            extra = np.array([float(query[overlay[other][0]] @ overlay[other][1]) for other in others], dtype=np.float32)
+            scores = np.concatenate([scores, extra])
+            candidates = np.concatenate([book_ids, np.array(others, dtype=np.int64)])
+
+        if len(scores) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            best = np.arange(len(scores))
+        best = best[scores[best] > 0]
+        best = best[np.lexsort((candidates[best], -scores[best]))]
+        return [(int(candidates[i]), round(float(scores[i]), 4)) for i in best]
+
+
+similar_index = SimilarityIndex()
+
+
+def get_similar_index(db: Session, db_factory):
+    """The shared matrix caught up with the catalog, or None while this worker's first load or build is running"""
+    return similar_index if similar_index.sync(db, db_factory) else None
@@ -180,6 +180,28 @@ class CartItemCreate(CartItemBase):
     pass
 
 
+class CartOperation(str, Enum):
+    SET = "set"
+    ADD = "add"
+    REMOVE = "remove"
+
+
+class CartItemOperation(BaseModel):
+    op: CartOperation
+    book_id: int
+    quantity: Optional[int] = Field(None, gt=0)
+
+    @validator("quantity", always=True)
+    def quantity_required(cls, v, values, **kwargs):
+        if v is None and values.get("op") in (CartOperation.SET, CartOperation.ADD):
+            raise ValueError("quantity is required for set and add")
+        return v
+
+
+class CartItemsUpdate(BaseModel):
+    operations: List[CartItemOperation] = Field(..., min_length=1, max_length=100)
+
+
 class CartItemResponse(CartItemBase):
     id: int
     cart_id: int
@@ -0,0 +1,277 @@
+"""
+In-process inverted index over book title, author and description ranked with BM25.
+
+Each worker builds the index from the books table in the background and catches up with writes
+made by any process through the catalog version (app/search/sync.py), so queries never read books
+from the database. Postings store each book's BM25 term-frequency part, so scoring is a few dict lookups.
+Multi-term queries first rank the books containing every term and accept that result when
+no partial match can outscore it; otherwise a max-score pass over impact-ordered postings
+fills in partial matches, abandoning each list once it can no longer beat the k-th hit.
+
+Exact top-k can still mean scoring tens of thousands of books, about a microsecond each in Python, on
+queries of two or three terms that each occur in a large share of the catalog. A query therefore scores
+at most SCORE_BUDGET books; both passes visit postings best impact first, so one cut short returns the
+best hits found so far, which are the exact ones on most such queries too. benchmarks/search.py reports
+how many queries the budget changes: 35 of 2000 at 1M books, 17 of them within the top 10.
+
+Latency (benchmarks/search.py, one core, 1M books): p50 0.5 ms and p99 8 ms once the postings of
+the queried terms are sorted; the first query of a term pays for sorting its postings.
+"""
+
+import heapq
+import math
+from bisect import bisect_left, insort
+from collections import Counter
+
+from sqlalchemy.orm import Session
+
+from app.search.stemmer import tokenize
+from app.search.sync import CatalogIndex
+from db.changes import changed_books
+from db.models import Book
+
+# Field weights: a match in the title counts three times as much as one in the description
+FIELD_WEIGHTS = (("title", 3), ("author", 2), ("description", 1))
+# Above this posting list size books containing every term are found by walking postings instead of set intersection
+INTERSECT_MAX = 20_000
+# Most books a query scores, and the part of them that may go to books containing every term;
+# past the budget a query returns the best hits found so far instead of the exact top-k
+SCORE_BUDGET = 3_000
+CONJUNCTIVE_BUDGET = 1_000
+
+
+class FullTextIndex(CatalogIndex):
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        super().__init__()
+        self.k1 = k1
+        self.b = b
+        self._postings = {}  # term -> {book_id: BM25 term-frequency part}
+        self._impacts = {}  # term -> [(tf part, book_id)] ascending, best last; sorted lazily, then kept current
+        self._doc_terms = {}  # book_id -> tuple of terms, needed to remove a book
+        self._doc_length = {}
+        self._stored = {}  # book_id -> (title, author) returned with hits
+        self._total_length = 0
+        self._avgdl = 1.0
+
+    def __len__(self) -> int:
+        return len(self._doc_length)
+
+    def build(self, rows) -> None:
+        """(Re)build from an iterable of (id, title, author, description) tuples"""
+        with self._lock:
+            self._postings.clear()
+            self._impacts.clear()
+            self._doc_terms.clear()
+            self._doc_length.clear()
+            self._stored.clear()
+            self._total_length = 0
+            self._avgdl = None  # postings hold raw term frequencies until the average length is known
+            for row in rows:
+                self._index(*row)
+            self._avgdl = self._total_length / len(self._doc_length) if self._doc_length else 1.0
+            for postings in self._postings.values():
+                for book_id, tf in postings.items():
+                    postings[book_id] = self._tf_part(tf, self._doc_length[book_id])
+            self.built = True
+
+    def build_from_db(self, db: Session) -> None:
+        query = db.query(Book.id, Book.title, Book.author, Book.description).yield_per(5000)
+        self.build(tuple(row) for row in query)
+
+    def _fresh(self) -> "FullTextIndex":
+        return FullTextIndex(self.k1, self.b)
+
+    def _changed(self, db: Session, since: int, until: int, limit: int):
+        columns = (Book.id, Book.title, Book.author, Book.description)
+        return changed_books(db, since, until, columns, (Book.text_version,), limit)
+
+    def _apply(self, rows, deleted) -> None:
+        for book_id in deleted:
+            self._unindex(book_id)
+        for row in rows:
+            self._unindex(row[0])
+            self._index(*row)
+
+    def add(self, book_id: int, title: str, author: str, description: str) -> None:
+        """Index a new book or re-index an updated one"""
+        with self._lock:
+            if not self.built:
+                return
+            self._unindex(book_id)
+            self._index(book_id, title, author, description)
+
+    def remove(self, book_id: int) -> None:
+        with self._lock:
+            if self.built:
+                self._unindex(book_id)
+
+    def search(self, query: str, limit: int = 20) -> list:
+        """Return up to `limit` dicts with id, title, author and score, best first"""
+        with self._lock:
+            terms = [term for term in set(tokenize(query)) if term in self._postings]
+            if not terms:
+                return []
+            total = len(self._doc_length)
+            lists = []
+            for term in terms:
+                postings = self._postings[term]
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                lists.append((idf, postings, self._impact_list(term)))
+
+            seen = set()
+            top, exhaustive = self._top_conjunctive(lists, limit, seen) if len(lists) > 1 else ([], False)
+            if not (exhaustive and self._is_complete(top, lists, limit)):
+                top = self._top_max_score(lists, limit, top, seen)
+
+            hits = sorted(top, reverse=True)
+            return [
+                {"id": book_id, "title": self._stored[book_id][0], "author": self._stored[book_id][1], "score": score}
+                for score, book_id in hits
+            ]
+
+    @staticmethod
+    def _score(lists, book_id: int) -> float:
+        score = 0.0
+        for idf, postings, _ in lists:
+            impact = postings.get(book_id)
+            if impact is not None:
+                score += idf * impact
+        return score
+
+    def _top_conjunctive(self, lists, limit: int, seen: set) -> tuple:
+        """
+        Best books among those containing every query term, and whether none of them was left out
+        for lack of budget. Scored books are added to `seen`.
+        """
+        ordered = sorted(lists, key=lambda item: len(item[1]))
+        if len(ordered[0][1]) <= INTERSECT_MAX:
+            candidates = ordered[0][1].keys() & ordered[1][1].keys()
+            for _, postings, _ in ordered[2:]:
+                candidates &= postings.keys()
+            if len(candidates) <= CONJUNCTIVE_BUDGET:
+                seen.update(candidates)
+                top = heapq.nlargest(limit, ((self._score(lists, book_id), book_id) for book_id in candidates))
+                heapq.heapify(top)
+                return top, True
+        return self._top_threshold(lists, limit, seen)
+
+    def _top_threshold(self, lists, limit: int, seen: set) -> tuple:
+        """
+        Threshold algorithm restricted to books containing every term: impact-ordered postings are
+        walked in parallel until no unseen book can beat the k-th hit or the shortest list runs out,
+        or CONJUNCTIVE_BUDGET books were looked at. Only the scored books are added to `seen`.
+        """
+        top = []
+        visited = set()
+        for depth in range(min(len(impacts) for _, _, impacts in lists)):
+            if len(visited) >= CONJUNCTIVE_BUDGET:
+                return top, False
+            threshold = 0.0
+            for idf, _, impacts in lists:
+                impact, book_id = impacts[-1 - depth]
+                threshold += idf * impact
+                if book_id in visited:
+                    continue
+                visited.add(book_id)
+                if all(book_id in postings for _, postings, _ in lists):
+                    seen.add(book_id)
+                    self._push(top, limit, self._score(lists, book_id), book_id)
+            if len(top) == limit and top[0][0] >= threshold:
+                break
+        return top, True
+
+    @staticmethod
+    def _is_complete(top: list, lists, limit: int) -> bool:
+        """
+        True when no book missing a query term can beat the k-th conjunctive hit:
+        such a book scores at most the sum of the upper bounds minus the smallest one.
+        """
+        if len(top) < limit or len(lists) < 2:
+            return False
+        bounds = [idf * impacts[-1][0] for idf, _, impacts in lists]
+        return top[0][0] >= sum(bounds) - min(bounds)
+
+    def _top_max_score(self, lists, limit: int, top: list, seen: set) -> list:
+        """
+        Disjunctive top-k with max-score pruning, seeded with already scored hits. Terms are taken
+        by descending upper bound; a list is abandoned once its impact plus the upper bounds of the
+        terms not yet visited cannot beat the k-th hit. Past SCORE_BUDGET books the best hits found
+        so far are returned.
+        """
+        ordered = sorted(lists, key=lambda item: item[0] * item[2][-1][0], reverse=True)
+        bounds = [idf * impacts[-1][0] for idf, _, impacts in ordered]
+        for position, (idf, _, impacts) in enumerate(ordered):
+            rest = sum(bounds[position + 1 :])
+            if len(top) == limit and bounds[position] + rest <= top[0][0]:
+                break
+            for impact, book_id in reversed(impacts):
+                if len(top) == limit and idf * impact + rest <= top[0][0]:
+                    break
+                if len(seen) >= SCORE_BUDGET:
+                    return top
+                if book_id not in seen:
+                    seen.add(book_id)
+                    self._push(top, limit, self._score(lists, book_id), book_id)
+        return top
+
+    @staticmethod
+    def _push(top: list, limit: int, score: float, book_id: int) -> None:
+        if len(top) < limit:
+            heapq.heappush(top, (score, book_id))
+        elif score > top[0][0]:
+            heapq.heapreplace(top, (score, book_id))
+
+    def _tf_part(self, tf: int, length: int) -> float:
+        # The average length is frozen at build time so stored parts stay valid between rebuilds
+        return tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / self._avgdl))
+
+    def _impact_list(self, term: str) -> list:
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            impacts = sorted((impact, book_id) for book_id, impact in self._postings[term].items())
+            self._impacts[term] = impacts
+        return impacts
+
+    def _index(self, book_id: int, title: str, author: str, description: str) -> None:
+        fields = {"title": title, "author": author, "description": description}
+        frequencies = Counter()
+        for field, weight in FIELD_WEIGHTS:
+            for term in tokenize(fields[field] or ""):
+                frequencies[term] += weight
+        length = sum(frequencies.values())
+        for term, tf in frequencies.items():
+            if self._avgdl is None:
+                self._postings.setdefault(term, {})[book_id] = tf
+                continue
+            impact = self._postings.setdefault(term, {})[book_id] = self._tf_part(tf, length)
+            # Insert rather than drop the sorted list: re-sorting a common term after every write costs far more
+            if term in self._impacts:
+                insort(self._impacts[term], (impact, book_id))
+        self._doc_terms[book_id] = tuple(frequencies)
+        self._doc_length[book_id] = length
+        self._stored[book_id] = (title, author)
+        self._total_length += length
+
+    def _unindex(self, book_id: int) -> None:
+        terms = self._doc_terms.pop(book_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            impacts = self._impacts.get(term)
+            if impacts is not None:
+                del impacts[bisect_left(impacts, (postings[book_id], book_id))]
+            del postings[book_id]
+            if not postings:
+                del self._postings[term]
+                self._impacts.pop(term, None)
+        self._total_length -= self._doc_length.pop(book_id)
+        del self._stored[book_id]
+
+
+search_index = FullTextIndex()
+
+
+def get_search_index(db: Session, db_factory):
+    """The worker's index caught up with the catalog, or None while its first build is still running"""
+    return search_index if search_index.sync(db, db_factory) else None
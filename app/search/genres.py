@@ -0,0 +1,94 @@
+"""
+Fuzzy genre name matching with trigrams.
+
+PostgreSQL answers with pg_trgm: the GIN index ix_genres_name_trgm (created by init_db) serves both
+the substring ILIKE and the % similarity operator. Other databases, SQLite in particular, use an
+in-process trigram index with the same semantics, rebuilt when the catalog version changes.
+"""
+
+import threading
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.search.stemmer import normalize
+from db.models import Genre
+from db.versions import current_version
+
+# Same default as pg_trgm.similarity_threshold
+SIMILARITY_THRESHOLD = 0.3
+
+
+def trigrams(text: str) -> set:
+    """pg_trgm-style trigrams: every word padded with two spaces in front and one behind"""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class GenreMatcher:
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.version = None
+        self._lock = threading.Lock()
+        self._names = {}  # genre_id -> normalized name
+        self._grams = {}  # genre_id -> trigram set
+        self._postings = {}  # trigram -> set of genre ids
+
+    def build(self, rows, version=None) -> None:
+        """(Re)build from (id, name) pairs"""
+        names, grams, postings = {}, {}, {}
+        for genre_id, name in rows:
+            names[genre_id] = normalize(name)
+            grams[genre_id] = trigrams(name)
+            for gram in grams[genre_id]:
+                postings.setdefault(gram, set()).add(genre_id)
+        with self._lock:
+            self._names, self._grams, self._postings = names, grams, postings
+            self.version = version
+
+    def match(self, query: str) -> list:
+        """Ids of genres containing the query or similar to it, most similar first"""
+        needle = normalize(query).strip()
+        if not needle:
+            return []
+        query_grams = trigrams(needle)
+        with self._lock:
+            names, grams, postings = self._names, self._grams, self._postings
+        shared = {}
+        for gram in query_grams:
+            for genre_id in postings.get(gram, ()):
+                shared[genre_id] = shared.get(genre_id, 0) + 1
+        # A substring shares every inner trigram with the name; shorter needles have none, so check every name
+        inner = {needle[i : i + 3] for i in range(len(needle) - 2)}
+        if inner:
+            candidates = set.intersection(*(postings.get(gram, set()) for gram in inner))
+        else:
+            candidates = names.keys()
+        scores = {genre_id: 1.0 for genre_id in candidates if needle in names[genre_id]}
+        for genre_id, count in shared.items():
+            similarity = count / (len(query_grams) + len(grams[genre_id]) - count)
+            if similarity >= self.threshold:
+                scores[genre_id] = max(scores.get(genre_id, 0.0), similarity)
+        return sorted(scores, key=lambda genre_id: (-scores[genre_id], genre_id))
+
+
+genre_matcher = GenreMatcher()
+
+
+def match_genres(db: Session, query: str) -> list:
+    """Ids of the genres matching a fuzzy name query"""
+    if db.get_bind().dialect.name == "postgresql":
+        rows = (
+            db.query(Genre.id)
+            .filter(or_(Genre.name.icontains(query, autoescape=True), Genre.name.op("%")(query)))
+            .order_by(Genre.name.op("<->")(query), Genre.id)
+            .all()
+        )
+        return [genre_id for genre_id, in rows]
+    version = current_version()
+    if genre_matcher.version != version:
+        genre_matcher.build(db.query(Genre.id, Genre.name).all(), version)
+    return genre_matcher.match(query)
@@ -0,0 +1,143 @@
+"""
+Tokenizer and Snowball (Porter) stemmer for Russian.
+Latin words and numbers are only case-folded.
+"""
+
+import re
+from functools import lru_cache
+
+VOWELS = "аеиоуыэюя"
+
+
+def _longest_first(*endings: str) -> tuple:
+    return tuple(sorted(endings, key=len, reverse=True))
+
+
+PERFECTIVE_GERUND_1 = _longest_first("вшись", "вши", "в")
+PERFECTIVE_GERUND_2 = _longest_first("ывшись", "ившись", "ывши", "ивши", "ыв", "ив")
+ADJECTIVE = _longest_first(
+    "ими", "ыми", "его", "ого", "ему", "ому",
+    "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею",
+)  # fmt: skip
+PARTICIPLE_1 = _longest_first("ем", "нн", "вш", "ющ", "щ")
+PARTICIPLE_2 = _longest_first("ивш", "ывш", "ующ")
+REFLEXIVE = _longest_first("ся", "сь")
+VERB_1 = _longest_first(
+    "ете", "йте", "ешь", "нно", "ла", "на", "ли", "ем", "ло", "но", "ет", "ют", "ны", "ть", "й", "л", "н",
+)  # fmt: skip
+VERB_2 = _longest_first(
+    "ейте", "уйте", "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло", "ено", "ует", "уют", "ены", "ить", "ыть",
+    "ишь", "ей", "уй", "ил", "ыл", "им", "ым", "ен", "ят", "ит", "ыт", "ую", "ю",
+)  # fmt: skip
+NOUN = _longest_first(
+    "иями", "ями", "ами", "ией", "иям", "ием", "иях",
+    "ев", "ов", "ие", "ье", "еи", "ии", "ей", "ой", "ий", "ям", "ем", "ам", "ом", "ах", "ях", "ию", "ью", "ия", "ья",
+    "а", "е", "и", "й", "о", "у", "ы", "ь", "ю", "я",
+)  # fmt: skip
+DERIVATIONAL = _longest_first("ость", "ост")
+SUPERLATIVE = _longest_first("ейше", "ейш")
+
+STOP_WORDS = frozenset(
+    """
+    а без более бы был была были было быть в вам вас весь во вот все всего всех вы где да даже для до его ее ей ему
+    если есть еще же за здесь и из или им их к как ко когда кто ли либо мне может мы на над надо наш не него нее нет
+    ни них но ну о об однако он она они оно от очень по под при с со так также такой там те тем то того тоже той только
+    том ты у уже хотя чего чей чем что чтобы чье чья эта эти это я
+    a an and are as at be by for from in is it of on or that the to with
+    """.split()
+)
+
+TOKEN_RE = re.compile(r"[0-9a-zа-я]+")
+
+
+def normalize(text: str) -> str:
+    """Case-fold and replace ё with е"""
+    return text.casefold().replace("ё", "е")
+
+
+def _regions(word: str) -> tuple:
+    """Return the start indexes of RV and R2"""
+    rv = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    r1 = len(word)
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    r2 = len(word)
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _strip(word: str, rv: int, endings: tuple, after_a: bool = False):
+    """Remove the longest ending found in RV; group-1 endings must follow а or я. Returns None if none matched."""
+    for ending in endings:
+        start = len(word) - len(ending)
+        if start < rv or not word.endswith(ending):
+            continue
+        if after_a and (start - 1 < rv or word[start - 1] not in "ая"):
+            continue
+        return word[:start]
+    return None
+
+
+@lru_cache(maxsize=200_000)
+def stem(word: str) -> str:
+    if not any("а" <= char <= "я" for char in word):
+        return word
+    rv, r2 = _regions(word)
+
+    # Step 1
+    stripped = _strip(word, rv, PERFECTIVE_GERUND_1, after_a=True)
+    if stripped is None:
+        stripped = _strip(word, rv, PERFECTIVE_GERUND_2)
+    if stripped is not None:
+        word = stripped
+    else:
+        word = _strip(word, rv, REFLEXIVE) or word
+        stripped = _strip(word, rv, ADJECTIVE)
+        if stripped is not None:
+            participle = _strip(stripped, rv, PARTICIPLE_1, after_a=True)
+            if participle is None:
+                participle = _strip(stripped, rv, PARTICIPLE_2)
+            word = participle if participle is not None else stripped
+        else:
+            stripped = _strip(word, rv, VERB_1, after_a=True)
+            if stripped is None:
+                stripped = _strip(word, rv, VERB_2)
+            if stripped is None:
+                stripped = _strip(word, rv, NOUN)
+            if stripped is not None:
+                word = stripped
+
+    # Step 2
+    if word.endswith("и") and len(word) - 1 >= rv:
+        word = word[:-1]
+
+    # Step 3
+    stripped = _strip(word, max(rv, r2), DERIVATIONAL)
+    if stripped is not None:
+        word = stripped
+
+    # Step 4
+    if word.endswith("нн") and len(word) - 2 >= rv:
+        return word[:-1]
+    stripped = _strip(word, rv, SUPERLATIVE)
+    if stripped is not None:
+        word = stripped
+        return word[:-1] if word.endswith("нн") and len(word) - 2 >= rv else word
+    if word.endswith("ь") and len(word) - 1 >= rv:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text: str) -> list:
+    """Split text into stemmed terms, dropping stop words"""
+    return [stem(token) for token in TOKEN_RE.findall(normalize(text)) if token not in STOP_WORDS]
@@ -0,0 +1,260 @@
+"""
+In-process prefix index for the search box typeahead over book titles and authors.
+
+Every word start of the normalized title and author (case-folded, ё -> е) is a key, so "азим" finds
+"Айзек Азимов" and "тайна" finds "Тайна гнева". A key is not stored as a string of its own: the
+normalized texts are appended, UTF-8 encoded and NUL-terminated, to one bytearray, and a key is the
+offset of its word start in it. Two array('I') columns hold the offsets and book ids of all keys sorted
+by (key, book id), about 8 bytes per key where a (str, int) tuple in a list took well over 100. UTF-8
+sorts like the code points it encodes, so a prefix is the slice between the binary searches for its
+bytes and for its bytes + 0xff. Short and common prefixes match a large share of the catalog, so the
+best books of every prefix whose slice is longer than SCAN_LIMIT are precomputed at build time and a
+lookup never ranks more than SCAN_LIMIT keys. Texts replaced by a write stay in the bytearray as
+garbage until the next rebuild.
+
+A precomputed list keeps up to HOT_CAPACITY books, more than a lookup can ask for, plus a floor: every
+book of the prefix left out of the list ranks below it. A write moves one entry in or out of the lists
+of its prefixes; only a list worn down below MAX_SUGGESTIONS entries is refilled from its slice, so a
+review on a bestseller no longer rescans every book starting with "а". A rating change leaves the keys alone.
+
+Each worker keeps its index in step with the catalog version like the full-text index does (see
+app/search/sync.py): title and author writes stamp Book.text_version, review writes Book.rating_version.
+"""
+
+import heapq
+import re
+from array import array
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from sqlalchemy.orm import Session
+
+from app.search.stemmer import normalize
+from app.search.sync import CatalogIndex
+from db.changes import changed_books
+from db.models import Book
+
+# Sorts after every byte of UTF-8 text
+MAX_BYTE = b"\xff"
+# Prefixes matching more keys than this get a precomputed list
+SCAN_LIMIT = 256
+# The largest limit a lookup can ask for
+MAX_SUGGESTIONS = 20
+# Length of the precomputed lists, so that writes seldom wear one down below MAX_SUGGESTIONS
+HOT_CAPACITY = 4 * MAX_SUGGESTIONS
+WORD_RE = re.compile(r"\w+")
+
+
+def keys(title: str, author: str) -> set:
+    """Normalized text from every word start of the title and the author"""
+    result = set()
+    for text in (title, author):
+        text = normalize(text or "")
+        for match in WORD_RE.finditer(text):
+            result.add(text[match.start():])
+    return result
+
+
+def _char_length(lead: int) -> int:
+    """Bytes of the UTF-8 character starting with byte `lead`"""
+    return 1 if lead < 0x80 else 2 if lead < 0xE0 else 3 if lead < 0xF0 else 4
+
+
+class PrefixIndex(CatalogIndex):
+    def __init__(self):
+        super().__init__()
+        self._text = bytearray()  # normalized titles and authors, each NUL-terminated
+        self._starts = array("I")  # text offset of every key, sorted by (key, book id)
+        self._ids = array("I")  # book id of every key, parallel to _starts
+        self._books = {}  # book_id -> (title, author, rating)
+        self._hot = {}  # common prefix -> [(rating, book_id)] ascending, best last, at most HOT_CAPACITY
+        self._floor = {}  # common prefix -> (rating, book_id) above every book left out of its list, or None
+
+    def __len__(self) -> int:
+        return len(self._books)
+
+    def build(self, rows) -> None:
+        """(Re)build from an iterable of (id, title, author, rating) tuples"""
+        with self._lock:
+            self._text, self._books = bytearray(), {}
+            # Sorted per first character, so only one bucket of key strings exists at a time
+            buckets = defaultdict(list)
+            for book_id, title, author, rating in rows:
+                self._books[book_id] = (title, author, rating)
+                for start in self._append(title, author):
+                    lead = self._text[start]
+                    buckets[bytes(self._text[start : start + _char_length(lead)])].append((start, book_id))
+            self._starts, self._ids = array("I"), array("I")
+            for first in sorted(buckets):
+                for start, book_id in sorted(buckets.pop(first), key=lambda entry: (self._key(entry[0]), entry[1])):
+                    self._starts.append(start)
+                    self._ids.append(book_id)
+            self._hot, self._floor = {}, {}
+            # Walk down the implicit trie of the sorted keys, stopping at prefixes with short slices
+            stack = [""]
+            while stack:
+                prefix = stack.pop()
+                start, end = self._slice(prefix)
+                if end - start <= SCAN_LIMIT:
+                    continue
+                if prefix:
+                    self._fill(prefix)
+                depth = len(prefix.encode("utf-8"))
+                position = start
+                while position < end:
+                    key = self._key(self._starts[position])
+                    if len(key) == depth:
+                        position += 1
+                        continue
+                    child = key[: depth + _char_length(key[depth])]
+                    stack.append(child.decode("utf-8"))
+                    position = self._bisect(child + MAX_BYTE, 0, position, end)
+            self.built = True
+
+    def build_from_db(self, db: Session) -> None:
+        query = db.query(Book.id, Book.title, Book.author, Book.rating).yield_per(5000)
+        self.build(tuple(row) for row in query)
+
+    def _changed(self, db: Session, since: int, until: int, limit: int):
+        columns = (Book.id, Book.title, Book.author, Book.rating)
+        return changed_books(db, since, until, columns, (Book.text_version, Book.rating_version), limit)
+
+    def _apply(self, rows, deleted) -> None:
+        for book_id in deleted:
+            self._unindex(book_id)
+        for row in rows:
+            self._update(*row)
+
+    def add(self, book_id: int, title: str, author: str, rating: float) -> None:
+        """Index a new book or re-index an updated one"""
+        with self._lock:
+            if self.built:
+                self._update(book_id, title, author, rating)
+
+    def remove(self, book_id: int) -> None:
+        with self._lock:
+            if self.built:
+                self._unindex(book_id)
+
+    def _update(self, book_id: int, title: str, author: str, rating: float) -> None:
+        book = self._books.get(book_id)
+        book_keys = keys(title, author)
+        if book is not None and keys(book[0], book[1]) == book_keys:
+            # Only the rating or the spelling changed: the sorted keys stay as they are
+            self._books[book_id] = (title, author, rating)
+            if rating != book[2]:
+                # Rank before unranking: a refill reads the new rating, then the stale entry is simply not found
+                for prefix in self._hot_prefixes(book_keys):
+                    self._rank(prefix, (rating, book_id))
+                    self._unrank(prefix, (book[2], book_id))
+            return
+        self._unindex(book_id)
+        self._books[book_id] = (title, author, rating)
+        for start in self._append(title, author):
+            position = self._bisect(self._key(start), book_id)
+            self._starts.insert(position, start)
+            self._ids.insert(position, book_id)
+        for prefix in self._hot_prefixes(book_keys):
+            self._rank(prefix, (rating, book_id))
+
+    def _unindex(self, book_id: int) -> None:
+        book = self._books.pop(book_id, None)
+        if book is None:
+            return
+        book_keys = keys(book[0], book[1])
+        for key in book_keys:
+            position = self._bisect(key.encode("utf-8"), book_id)
+            del self._starts[position]
+            del self._ids[position]
+        for prefix in self._hot_prefixes(book_keys):
+            self._unrank(prefix, (book[2], book_id))
+
+    def _append(self, title: str, author: str) -> list:
+        """Append a book's normalized texts to the bytearray; returns the offsets of its distinct keys"""
+        starts, seen = [], set()
+        for text in (title, author):
+            text = normalize(text or "")
+            offset, previous = len(self._text), 0
+            self._text += text.encode("utf-8") + b"\0"
+            for match in WORD_RE.finditer(text):
+                offset += len(text[previous : match.start()].encode("utf-8"))
+                previous = match.start()
+                if text[previous:] not in seen:
+                    seen.add(text[previous:])
+                    starts.append(offset)
+        return starts
+
+    def _key(self, start: int) -> bytes:
+        return bytes(self._text[start : self._text.index(0, start)])
+
+    def _bisect(self, key: bytes, book_id: int, low: int = 0, high: int = None) -> int:
+        """First position whose (key, book id) is not below the given one"""
+        high = len(self._starts) if high is None else high
+        while low < high:
+            middle = (low + high) // 2
+            if (self._key(self._starts[middle]), self._ids[middle]) < (key, book_id):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _rank(self, prefix: str, hit: tuple) -> None:
+        """Put a book of the prefix into its list, or leave it out if it ranks below the floor"""
+        hot, floor = self._hot[prefix], self._floor[prefix]
+        if floor is not None and hit < floor:
+            return
+        insort(hot, hit)
+        if len(hot) > HOT_CAPACITY:
+            self._floor[prefix] = hot.pop(0)
+
+    def _unrank(self, prefix: str, hit: tuple) -> None:
+        """Take a book of the prefix out of its list, refilling the list when too few known-best books remain"""
+        hot = self._hot[prefix]
+        position = bisect_left(hot, hit)
+        if position < len(hot) and hot[position] == hit:
+            del hot[position]
+            if len(hot) < MAX_SUGGESTIONS and self._floor[prefix] is not None:
+                self._fill(prefix)
+
+    def _fill(self, prefix: str) -> None:
+        ranked = list(self._ranked(*self._slice(prefix)))
+        self._hot[prefix] = sorted(heapq.nlargest(HOT_CAPACITY, ranked))
+        self._floor[prefix] = self._hot[prefix][0] if len(ranked) > HOT_CAPACITY else None
+
+    def _hot_prefixes(self, book_keys) -> set:
+        return {key[:length] for key in book_keys for length in range(1, len(key) + 1) if key[:length] in self._hot}
+
+    def _slice(self, prefix: str) -> tuple:
+        """Positions of the keys starting with `prefix`"""
+        prefix = prefix.encode("utf-8")
+        start = self._bisect(prefix, 0)
+        return start, self._bisect(prefix + MAX_BYTE, 0, start)
+
+    def _ranked(self, start: int, end: int):
+        """(rating, book_id) of every book with a key in the slice, once each"""
+        seen = set(self._ids[start:end])
+        return ((self._books[book_id][2], book_id) for book_id in seen)
+
+    def suggest(self, prefix: str, limit: int = 10) -> list:
+        """Return up to `limit` dicts with id, title, author and rating of the best rated matching books"""
+        prefix = normalize(prefix).lstrip()
+        if not prefix:
+            return []
+        limit = min(limit, MAX_SUGGESTIONS)
+        with self._lock:
+            if prefix in self._hot:
+                hits = self._hot[prefix][: -limit - 1 : -1]
+            else:
+                hits = heapq.nlargest(limit, self._ranked(*self._slice(prefix)))
+            return [
+                {"id": book_id, "title": self._books[book_id][0], "author": self._books[book_id][1], "rating": rating}
+                for rating, book_id in hits
+            ]
+
+
+suggest_index = PrefixIndex()
+
+
+def get_suggest_index(db: Session, db_factory):
+    """The worker's index caught up with the catalog, or None while its first build is still running"""
+    return suggest_index if suggest_index.sync(db, db_factory) else None
@@ -0,0 +1,114 @@
+"""
+Keeping a worker's in-memory index of the catalog current across processes.
+
+An index remembers the catalog version it reflects. sync() compares it with the committed version,
+a primary key lookup; when anyone wrote since (this worker, another one or the CLI importer) the
+changed and deleted books are read with the indexed range queries of db/changes.py and folded in.
+A larger backlog and the first build run in a background thread on a fresh instance that is swapped
+in when complete, so requests keep being answered from the previous contents meanwhile. gunicorn
+starts the first builds as soon as a worker boots (gunicorn.conf.py); a request that still finds
+no index waits up to INDEX_BUILD_WAIT seconds for it. An index of something other than the catalog
+brings its own version and deletions through _current_version() and _deleted(), see app/recommend/also_bought.py.
+"""
+
+import threading
+from abc import ABC, abstractmethod
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from db.changes import deleted_books
+from db.versions import current_version
+
+# Attributes that belong to the long-lived instance and are not taken over from a fresh build
+IMMUTABLE = ("_lock", "_ready", "_building")
+
+
+class CatalogIndex(ABC):
+    """Base of the per-worker indexes; subclasses implement build_from_db(), _changed() and _apply()"""
+
+    def __init__(self):
+        self.built = False
+        self.version = None  # catalog version the contents reflect
+        self._lock = threading.RLock()
+        self._ready = threading.Event()
+        self._building = False
+
+    @abstractmethod
+    def build_from_db(self, db: Session) -> None:
+        """Fill the index from the whole catalog"""
+
+    def _fresh(self):
+        """An empty index with the same settings"""
+        return type(self)()
+
+    def _fold_in_limit(self) -> int:
+        """How many changed books sync() folds in before it rebuilds instead"""
+        return settings.INDEX_FOLD_IN_LIMIT
+
+    def _current_version(self) -> int:
+        """The version to catch up with, read outside the caller's transaction"""
+        return current_version()
+
+    def _deleted(self, db: Session, since: int) -> list:
+        """Ids of the books deleted after version `since`"""
+        return deleted_books(db, since)
+
+    @abstractmethod
+    def _changed(self, db: Session, since: int, until: int, limit: int):
+        """
+        Rows of the books written after version `since` up to `until`, as _apply() takes them,
+        or None above `limit`
+        """
+
+    @abstractmethod
+    def _apply(self, rows, deleted) -> None:
+        """Fold changed rows and deleted book ids in; called under the lock"""
+
+    def sync(self, db: Session, db_factory) -> bool:
+        """Catch up with the catalog; False while the first build is not done after INDEX_BUILD_WAIT seconds"""
+        if not self.built:
+            self.build_in_background(db_factory)
+            return self._ready.wait(settings.INDEX_BUILD_WAIT)
+        version = self._current_version()
+        since = self.version
+        if version == since or self._building:
+            return True
+        rows = self._changed(db, since, version, self._fold_in_limit())
+        if rows is None:
+            self.build_in_background(db_factory)
+            return True
+        deleted = self._deleted(db, since)
+        with self._lock:
+            # Another request may have caught up while this one was reading
+            if self.version == since:
+                self._apply(rows, deleted)
+                self.version = version
+        return True
+
+    def build_in_background(self, db_factory) -> None:
+        """Build a fresh copy from the database in a thread and swap it in, unless a build is running"""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+
+        def build():
+            db = db_factory()
+            try:
+                # Read the version first: rows committed later are folded in again by the next sync.
+                # A build that loads contents made elsewhere sets the version they reflect itself
+                version = self._current_version()
+                fresh = self._fresh()
+                fresh.build_from_db(db)
+                if fresh.version is None:
+                    fresh.version = version
+                state = {name: value for name, value in vars(fresh).items() if name not in IMMUTABLE}
+                with self._lock:
+                    vars(self).update(state)
+                self._ready.set()
+            finally:
+                db.close()
+                self._building = False
+
+        threading.Thread(target=build, name=f"{type(self).__name__}-build", daemon=True).start()
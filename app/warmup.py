@@ -0,0 +1,12 @@
+"""Start building a freshly forked worker's in-memory indexes before its first request, see gunicorn.conf.py"""
+
+from app.recommend.also_bought import also_bought
+from app.recommend.similar import similar_index
+from app.search.fulltext import search_index
+from app.search.suggest import suggest_index
+from db.database import get_db
+
+
+def warm_up() -> None:
+    for index in (search_index, suggest_index, similar_index, also_bought):
+        index.build_in_background(get_db)
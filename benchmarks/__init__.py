@@ -0,0 +1 @@
+from benchmarks import _common  # noqa: F401  (environment setup, must run before app and db are imported)
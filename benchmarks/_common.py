@@ -0,0 +1,28 @@
+"""
+Setup shared by the benchmark scripts.
+
+Importing the benchmarks package runs this module first, so DATABASE_URL and SIMILAR_INDEX_DIR point
+into a fresh temporary directory before config reads them and no benchmark touches a real database.
+Set BENCHMARK_DATABASE_URL to run against another database instead, e.g. a scratch PostgreSQL one.
+"""
+
+import os
+import tempfile
+import time
+
+TEMP_DIR = tempfile.mkdtemp(prefix="bookstore-bench-")
+
+os.environ["DATABASE_URL"] = os.environ.get("BENCHMARK_DATABASE_URL") or "sqlite:///" + os.path.join(
+    TEMP_DIR, "bench.db"
+)
+os.environ["SIMILAR_INDEX_DIR"] = os.path.join(TEMP_DIR, "similar")
+
+
+def best_of(fn, *args, repeat: int = 5) -> float:
+    """Seconds taken by the fastest of `repeat` calls of fn(*args)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
@@ -0,0 +1,63 @@
+"""
+Building and querying the "also bought" co-occurrence matrix.
+
+    python -m benchmarks.also_bought [orders] [books]
+
+Generates synthetic orders of 1-8 books with a skewed popularity and compares building the
+book x book counts with nested Python loops and with the sparse product in CoOccurrence.build,
+then times top-10 queries.
+"""
+
+import sys
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from app.recommend.also_bought import CoOccurrence
+
+
+def synthetic_pairs(orders: int, books: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    sizes = rng.integers(1, 9, size=orders)
+    order_ids = np.repeat(np.arange(orders), sizes)
+    book_ids = np.minimum(rng.zipf(1.3, size=len(order_ids)), books)
+    return np.column_stack([order_ids, book_ids]).astype(np.int64)
+
+
+def python_counts(pairs: np.ndarray) -> dict:
+    baskets = defaultdict(set)
+    for order_id, book_id in pairs.tolist():
+        baskets[order_id].add(book_id)
+    counts = defaultdict(Counter)
+    for basket in baskets.values():
+        for book_id in basket:
+            counts[book_id].update(other for other in basket if other != book_id)
+    return counts
+
+
+def main() -> None:
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    books = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    pairs = synthetic_pairs(orders, books)
+    print(f"{orders} orders, {len(pairs)} order lines")
+
+    start = time.perf_counter()
+    counts = python_counts(pairs)
+    print(f"python loops: {time.perf_counter() - start:7.2f} s")
+
+    matrix = CoOccurrence()
+    start = time.perf_counter()
+    matrix.build(pairs)
+    print(f"sparse X.T@X: {time.perf_counter() - start:7.2f} s, {matrix._matrix.nnz} non-zero pairs")
+
+    sample = np.unique(pairs[:, 1])[:1000].tolist()
+    assert dict(matrix.top(sample[0], 10**6)) == dict(counts[sample[0]])
+    start = time.perf_counter()
+    for book_id in sample:
+        matrix.top(book_id, 10)
+    print(f"top-10 query: {(time.perf_counter() - start) / len(sample) * 1e6:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Concurrency stress test for adding to a cart: no increment may be lost.
+
+    python -m benchmarks.cart_concurrency [threads] [adds]
+
+`threads` logged-in clients of one fresh user start together, so they race to create the cart,
+then each POSTs /api/cart `adds` times for the same two books. Afterwards the cart must hold
+threads * adds copies of each book, and item_count and total_price must agree with the items.
+Runs against a temporary SQLite database unless BENCHMARK_DATABASE_URL is set (e.g. to a PostgreSQL one).
+Exits with status 1 on any lost increment or failed request.
+"""
+
+import sys
+import threading
+import time
+
+from app import create_app
+from db.database import get_db
+from db.migrator import run_migrations
+from db.models import Book
+
+USER = {"username": "stress", "email": "stress@example.com", "phone": "+79990000001", "password": "secret123"}
+BOOKS = (1, 2)
+
+
+def main() -> None:
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    adds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    run_migrations()
+    app = create_app()
+    app.test_client().post("/api/users/register", json={**USER, "confirm_password": USER["password"]})
+
+    clients = []
+    for _ in range(threads):
+        client = app.test_client()
+        client.post("/api/users/login", json={"email": USER["email"], "password": USER["password"]})
+        clients.append(client)
+    barrier = threading.Barrier(threads)
+    failures = []
+
+    def worker(client):
+        barrier.wait()
+        for i in range(adds):
+            response = client.post("/api/cart", json={"book_id": BOOKS[i % len(BOOKS)], "quantity": 1})
+            if response.status_code != 200:
+                failures.append(response.get_data(as_text=True))
+
+    start = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    cart = clients[0].get("/api/cart").get_json()
+    quantities = {item["book_id"]: item["quantity"] for item in cart["items"]}
+    prices = dict(get_db().query(Book.id, Book.price).filter(Book.id.in_(BOOKS)))
+    expected = {book_id: threads * adds // len(BOOKS) for book_id in BOOKS}
+    expected_total = round(sum(prices[book_id] * quantity for book_id, quantity in expected.items()), 2)
+
+    print(f"{threads} threads x {adds} adds in {elapsed:.2f} s ({threads * adds / elapsed:,.0f} adds/s)")
+    print(f"quantities {quantities}, expected {expected}")
+    print(f"item_count {cart['item_count']}, total_price {cart['total_price']}, expected {expected_total}")
+    ok = (
+        not failures
+        and quantities == expected
+        and cart["item_count"] == threads * adds
+        and abs(cart["total_price"] - expected_total) < 0.01
+    )
+    if failures:
+        print(f"{len(failures)} failed requests, first: {failures[0][:200]}")
+    print("OK" if ok else "LOST UPDATES")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
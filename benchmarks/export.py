@@ -0,0 +1,64 @@
+"""
+Memory and throughput of the streaming catalog export.
+
+    python -m benchmarks.export [rows] [ndjson|csv]
+
+Fills a fresh SQLite database through the bulk importer, then drains GET /api/books/export
+chunk by chunk and reports rows per second and the growth of the peak resident set size.
+"""
+
+import io
+import json
+import sys
+import time
+
+from benchmarks.importer import peak_rss_mb, synthetic_rows
+from db.database import SessionLocal, init_db
+from db.importer import import_books
+
+
+class NdjsonStream(io.RawIOBase):
+    """A readable binary stream over synthetic rows, so seeding does not need a file"""
+
+    def __init__(self, rows: int):
+        self._lines = (json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n" for row in synthetic_rows(rows))
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        while len(self._buffer) < len(target):
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    fmt = sys.argv[2] if len(sys.argv) > 2 else "ndjson"
+    init_db()
+    import_books(SessionLocal(), io.BufferedReader(NdjsonStream(rows)), "ndjson")
+    SessionLocal.remove()
+
+    from run import app
+
+    client = app.test_client()
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    response = client.get(f"/api/books/export?format={fmt}", buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    elapsed = time.perf_counter() - start
+    response.close()
+
+    print(f"exported {rows} rows, {size / 2**20:.0f} MiB {fmt} in {elapsed:.1f} s: {rows / elapsed:,.0f} rows/s")
+    print(f"peak RSS: {baseline:.0f} MiB before, {peak_rss_mb():.0f} MiB after")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Books-by-genre cost against the number of genres a query matches.
+
+    python -m benchmarks.genres [books per genre]
+
+Legacy: ILIKE over genres, then one books query per matched genre, returning everything.
+New:    trigram genre match (in-process on SQLite), then one joined query for a page of 50.
+"""
+
+import sys
+import time
+
+from sqlalchemy import event
+
+from app.api.filters import apply_sort
+from app.api.pagination import paginate
+from app.api.serializers import book_query, serialize_book
+from app.search.genres import match_genres
+from db.database import SessionLocal, analyze_sqlite, get_engine, init_db
+from db.models import Book, Genre
+
+# Genre name prefix -> number of genres sharing it
+GROUPS = {"Альфа": 1, "Бета": 10, "Гамма": 100, "Дельта": 1000}
+PAGE = 50
+
+
+def seed(session, per_genre: int) -> None:
+    genres = [Genre(name=f"{prefix} {i}") for prefix, count in GROUPS.items() for i in range(count)]
+    session.add_all(genres)
+    session.flush()
+    session.bulk_insert_mappings(
+        Book,
+        [
+            {
+                "title": f"Книга {genre.id}-{i}",
+                "author": f"Автор {i}",
+                "price": 100 + (genre.id * 7 + i) % 900,
+                "genre_id": genre.id,
+                "cover": "https://example.com/cover.jpg",
+                "description": "Описание",
+                "rating": 0,
+                "year": 1950 + i % 70,
+            }
+            for genre in genres
+            for i in range(per_genre)
+        ],
+    )
+    session.commit()
+
+
+def legacy(session, name: str) -> list:
+    books = []
+    for genre in session.query(Genre).filter(Genre.name.ilike(f"%{name}%")).all():
+        books.extend(serialize_book(book) for book in book_query(session).filter(Book.genre_id == genre.id).all())
+    return books
+
+
+def single_query(session, name: str) -> list:
+    genre_ids = match_genres(session, name)
+    query, cursor_key = apply_sort(book_query(session).filter(Book.genre_id.in_(genre_ids)), {})
+    books, _ = paginate(query.limit(PAGE + 1).all(), PAGE, cursor_key)
+    return [serialize_book(book) for book in books]
+
+
+def measure(fn, name: str, repeat: int = 5) -> tuple:
+    statements = 0
+
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    event.listen(get_engine(), "before_cursor_execute", count)
+    try:
+        timings = []
+        for _ in range(repeat):
+            session = SessionLocal()
+            statements = 0
+            start = time.perf_counter()
+            rows = fn(session, name)
+            timings.append(time.perf_counter() - start)
+            SessionLocal.remove()
+    finally:
+        event.remove(get_engine(), "before_cursor_execute", count)
+    return min(timings), statements, len(rows)
+
+
+def main() -> None:
+    per_genre = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    init_db()
+    seed(SessionLocal(), per_genre)
+    SessionLocal.remove()
+    analyze_sqlite()
+
+    print(f"{'genres':>7} | {'legacy ms':>10} {'queries':>8} {'rows':>6} | {'new ms':>8} {'queries':>8} {'rows':>5}")
+    for prefix, count in GROUPS.items():
+        old, old_queries, old_rows = measure(legacy, prefix)  # SQLite ILIKE does not fold Cyrillic case
+        new, new_queries, new_rows = measure(single_query, prefix.lower())
+        print(
+            f"{count:>7} | {old * 1000:>10.1f} {old_queries:>8} {old_rows:>6} "
+            f"| {new * 1000:>8.1f} {new_queries:>8} {new_rows:>5}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Throughput and memory of the streaming bulk importer.
+
+    python -m benchmarks.importer [rows] [ndjson|csv]
+
+Writes a synthetic catalog file to a temporary directory, imports it into a fresh SQLite
+database and reports rows per second and the growth of the peak resident set size.
+"""
+
+import csv
+import json
+import os
+import resource
+import sys
+import time
+
+from benchmarks._common import TEMP_DIR
+from db.database import SessionLocal, init_db
+from db.importer import import_books
+
+FIELDS = ("title", "author", "price", "genre", "cover", "description", "year")
+
+
+def synthetic_rows(count: int):
+    for i in range(count):
+        yield {
+            "title": f"Книга {i}",
+            "author": f"Автор {i % 5000}",
+            "price": 100 + i % 900,
+            "genre": f"Жанр {i % 40}",
+            "cover": f"https://example.com/covers/book_{i}.jpg",
+            "description": "Увлекательное приключение с неожиданным концом.",
+            "year": 1900 + i % 120,
+        }
+
+
+def write_file(path: str, rows: int, fmt: str) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(synthetic_rows(rows))
+        else:
+            for row in synthetic_rows(rows):
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    fmt = sys.argv[2] if len(sys.argv) > 2 else "ndjson"
+    path = os.path.join(TEMP_DIR, f"catalog.{fmt}")
+    write_file(path, rows, fmt)
+    init_db()
+
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    with open(path, "rb") as stream:
+        report = import_books(SessionLocal(), stream, fmt)
+    elapsed = time.perf_counter() - start
+
+    print(f"file: {os.path.getsize(path) / 2**20:.0f} MiB {fmt}, {rows} rows")
+    print(f"imported {report.imported}, failed {report.failed} in {elapsed:.1f} s: {rows / elapsed:,.0f} rows/s")
+    print(f"peak RSS: {baseline:.0f} MiB before, {peak_rss_mb():.0f} MiB after")
+
+
+if __name__ == "__main__":
+    main()
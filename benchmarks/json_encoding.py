@@ -0,0 +1,69 @@
+"""
+JSON encoders of the Api's application/json representation on list endpoints.
+
+    python -m benchmarks.json_encoding [orders]
+
+Seeds a temporary SQLite database with 5000 books and a user with `orders` orders of three items,
+then times GET /api/books/?limit=500 and GET /api/orders/ end to end and the encoding step alone,
+for flask-restx's stock representation and every encoder in app.api.representations.ENCODERS.
+"""
+
+import io
+import json
+import sys
+
+from app import create_app
+from app.api import representations
+from benchmarks._common import best_of
+from benchmarks.export import NdjsonStream
+from db.database import get_db
+from db.importer import import_books
+from db.migrator import run_migrations
+from db.models import Book, Order, OrderItem, User
+
+USER = {"username": "bench", "email": "bench@example.com", "phone": "+79990000000", "password": "secret123"}
+ENDPOINTS = ("/api/books/?limit=500", "/api/orders/")
+
+
+def restx_dumps(data) -> bytes:
+    """flask_restx.representations.output_json as shipped"""
+    return (json.dumps(data) + "\n").encode("utf-8")
+
+
+def seed(client, orders: int) -> None:
+    import_books(get_db(), io.BufferedReader(NdjsonStream(5000)), "ndjson")
+    client.post("/api/users/register", json={**USER, "confirm_password": USER["password"]})
+    client.post("/api/users/login", json={"email": USER["email"], "password": USER["password"]})
+    db = get_db()
+    user = db.query(User).filter_by(email=USER["email"]).one()
+    book_ids = [book_id for book_id, in db.query(Book.id)]
+    for i in range(orders):
+        items = [
+            OrderItem(book_id=book_ids[(i * 3 + j) % len(book_ids)], quantity=1 + j, price=100.0 + j) for j in range(3)
+        ]
+        db.add(Order(user_id=user.id, total_amount=sum(item.price * item.quantity for item in items),
+                     shipping_address=f"Улица {i}", items=items))  # fmt: skip
+    db.commit()
+
+
+def main() -> None:
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    run_migrations()
+    app = create_app()
+    client = app.test_client()
+    seed(client, orders)
+
+    print(f"{'encoder':>8} | {'endpoint':<24} {'request ms':>10} {'encode ms':>10} {'bytes':>8}")
+    for name, dumps in {"restx": restx_dumps, **representations.ENCODERS}.items():
+        representations.set_json_encoder(dumps)
+        for url in ENDPOINTS:
+            payload = client.get(url).get_json()
+            request_time = best_of(lambda: client.get(url), repeat=20)
+            with app.test_request_context():
+                encode_time = best_of(lambda: dumps(payload), repeat=20)
+                size = len(dumps(payload))
+            print(f"{name:>8} | {url:<24} {request_time * 1000:>10.2f} {encode_time * 1000:>10.2f} {size:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Query latency of the in-process full-text index on a synthetic Russian catalog.
+
+    python -m benchmarks.search [books] [queries]
+
+Words follow a Zipf distribution over a generated vocabulary; queries take 1-3 words
+from the title and author of a random book, like a user looking for a known book.
+Also reports how many queries the scoring budget (fulltext.SCORE_BUDGET) keeps from the exact top-k.
+"""
+
+import itertools
+import random
+import sys
+import time
+
+from app.search import fulltext
+from app.search.fulltext import FullTextIndex
+
+SYLLABLES = "ба ва га да жа за ка ла ма на па ра са та фа ха ца ча ша ло ро то но ми ри ти ни ку ру ту ле ре те не".split()
+ENDINGS = "а о ый ая ое ие ов ей ами ость ение".split()
+
+
+def vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) + rng.choice(ENDINGS))
+    return list(words)
+
+
+def zipf_cum_weights(size: int) -> list:
+    return list(itertools.accumulate(1 / rank for rank in range(1, size + 1)))
+
+
+def synthetic_books(count: int, rng: random.Random):
+    words = vocabulary(30_000, rng)
+    weights = zipf_cum_weights(len(words))
+    authors = [" ".join(pair).title() for pair in zip(rng.sample(words, 5_000), rng.sample(words, 5_000))]
+    for book_id in range(1, count + 1):
+        title = " ".join(rng.choices(words, cum_weights=weights, k=rng.randint(2, 4)))
+        description = " ".join(rng.choices(words, cum_weights=weights, k=rng.randint(8, 20)))
+        yield book_id, title, rng.choice(authors), description
+
+
+def main() -> None:
+    books = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2_000
+    rng = random.Random(42)
+
+    index = FullTextIndex()
+    catalog = {}
+
+    def rows():
+        for row in synthetic_books(books, rng):
+            if rng.random() < 0.01:
+                catalog[row[0]] = row
+            yield row
+
+    start = time.perf_counter()
+    index.build(rows())
+    print(f"built {len(index)} books in {time.perf_counter() - start:.1f} s")
+
+    workload = []
+    for row in rng.choices(list(catalog.values()), k=queries):
+        words = (row[1] + " " + row[2]).split()
+        workload.append(" ".join(rng.sample(words, min(len(words), rng.randint(1, 3)))))
+    for query in workload[:200]:  # warm the lazily sorted postings
+        index.search(query, 20)
+
+    report(index, workload)
+    exactness(index, workload)
+
+    # Writes folded in by sync() keep the sorted postings, so queries right after them stay as fast
+    updates = rng.choices(list(catalog.values()), k=1000)
+    start = time.perf_counter()
+    for book_id, title, author, description in updates:
+        index.add(rng.choice((book_id, books + book_id)), title, author, description)
+    print(f"add: {(time.perf_counter() - start) / len(updates) * 1000:.2f} ms per book, then:")
+    report(index, workload)
+
+
+def report(index: FullTextIndex, workload: list) -> None:
+    latencies = []
+    for query in workload:
+        start = time.perf_counter()
+        index.search(query, 20)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(
+        ", ".join(
+            f"{label} {latencies[int(quantile * (len(latencies) - 1))] * 1000:.2f} ms"
+            for label, quantile in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+        )
+    )
+
+
+def exactness(index: FullTextIndex, workload: list) -> None:
+    """How many queries the scoring budget cut short, against the exact BM25 top-k"""
+    budgeted = [index.search(query, 20) for query in workload]
+    budgets = fulltext.SCORE_BUDGET, fulltext.CONJUNCTIVE_BUDGET
+    fulltext.SCORE_BUDGET = fulltext.CONJUNCTIVE_BUDGET = float("inf")
+    try:
+        exact = [index.search(query, 20) for query in workload]
+    finally:
+        fulltext.SCORE_BUDGET, fulltext.CONJUNCTIVE_BUDGET = budgets
+
+    def scores(hits):
+        return [round(hit["score"], 6) for hit in hits]
+
+    differ = sum(scores(a) != scores(b) for a, b in zip(budgeted, exact))
+    top10 = sum(scores(a[:10]) != scores(b[:10]) for a, b in zip(budgeted, exact))
+    print(f"budget: {differ} of {len(workload)} queries differ from exact BM25, {top10} in the top 10")
+
+
+if __name__ == "__main__":
+    main()
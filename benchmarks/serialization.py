@@ -0,0 +1,96 @@
+"""
+Compare the legacy book serialization path with app.api.serializers.
+
+    python -m benchmarks.serialization [rows]
+
+Legacy: lazy genre load per row -> BookResponse -> .json() -> json.loads -> marshal(book_model).
+New:    one joined SELECT -> serialize_book.
+"""
+
+import json
+import sys
+
+from flask_restx import marshal
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.api.books import book_model
+from app.api.serializers import book_query, serialize_book
+from app.schemas import BookResponse
+from benchmarks._common import best_of
+from db.models import Base, Book, Genre
+
+
+def legacy_book_to_response(book: Book) -> dict:
+    return json.loads(
+        BookResponse(
+            id=book.id,
+            title=str(book.title),
+            author=str(book.author),
+            price=float(book.price),
+            genre=str(book.genre.name) if book.genre else "",
+            cover=str(book.cover),
+            description=str(book.description),
+            rating=float(book.rating) if book.rating is not None else 0.0,
+            year=int(book.year),
+            created_at=book.created_at,
+            updated_at=book.updated_at,
+        ).json()
+    )
+
+
+def seed(session, rows: int) -> None:
+    genres = [Genre(name=f"Жанр {i}") for i in range(20)]
+    session.add_all(genres)
+    session.flush()
+    session.add_all(
+        Book(
+            title=f"Книга {i}",
+            author=f"Автор {i % 500}",
+            price=100 + i % 900,
+            genre_id=genres[i % len(genres)].id,
+            cover=f"https://example.com/covers/book_{i}.jpg",
+            description="Увлекательное приключение с неожиданным концом.",
+            rating=(i % 50) / 10,
+            year=1900 + i % 120,
+        )
+        for i in range(rows)
+    )
+    session.commit()
+
+
+def legacy(Session) -> list:
+    session = Session()
+    try:
+        books = session.query(Book).all()
+        return marshal([legacy_book_to_response(book) for book in books], book_model)
+    finally:
+        session.close()
+
+
+def single_pass(Session) -> list:
+    session = Session()
+    try:
+        return [serialize_book(book) for book in book_query(session).all()]
+    finally:
+        session.close()
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    seed(Session(), rows)
+
+    assert json.dumps(legacy(Session), sort_keys=True) == json.dumps(single_pass(Session), sort_keys=True)
+
+    old = best_of(legacy, Session)
+    new = best_of(single_pass, Session)
+    print(f"rows={rows}")
+    print(f"legacy:      {old * 1000:8.1f} ms")
+    print(f"single pass: {new * 1000:8.1f} ms  ({old / new:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Building, loading and querying the "similar books" matrix.
+
+    python -m benchmarks.similar [books]
+
+Seeds a temporary SQLite database with synthetic books, builds the hashed TF-IDF matrix into a
+temporary SIMILAR_INDEX_DIR, then times what a second worker pays to memory-map it and the
+top-10 query latency, against scoring every book with Python dicts.
+"""
+
+import io
+import math
+import sys
+import time
+
+from app.recommend.similar import SimilarityIndex, hashed_terms
+from benchmarks.export import NdjsonStream
+from db.database import get_db, init_db
+from db.importer import import_books
+from db.models import Book
+
+
+def python_top(vectors: dict, book_id: int, limit: int) -> list:
+    query = vectors[book_id]
+    scores = [
+        (sum(weight * vector.get(term, 0.0) for term, weight in query.items()), other)
+        for other, vector in vectors.items()
+        if other != book_id
+    ]
+    return sorted(scores, reverse=True)[:limit]
+
+
+def main() -> None:
+    books = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    init_db()
+    import_books(get_db(), io.BufferedReader(NdjsonStream(books)), "ndjson")
+
+    start = time.perf_counter()
+    generation = SimilarityIndex()._build_locked(get_db())
+    print(f"build {books} books: {time.perf_counter() - start:7.2f} s")
+
+    index = SimilarityIndex()
+    start = time.perf_counter()
+    index._load(generation)
+    print(f"mmap load:       {(time.perf_counter() - start) * 1000:7.2f} ms")
+
+    sample = index._book_ids[:: max(1, len(index._book_ids) // 200)].tolist()
+    start = time.perf_counter()
+    for book_id in sample:
+        index.top(book_id, 10)
+    print(f"top-10 sparse:   {(time.perf_counter() - start) / len(sample) * 1000:7.2f} ms")
+
+    vectors = {}
+    for book_id, title, author, description in get_db().query(Book.id, Book.title, Book.author, Book.description):
+        terms = hashed_terms(title, author, description)
+        norm = math.sqrt(sum(count * count for count in terms.values())) or 1.0
+        vectors[book_id] = {term: count / norm for term, count in terms.items()}
+    start = time.perf_counter()
+    for book_id in sample[:10]:
+        python_top(vectors, book_id, 10)
+    print(f"top-10 python:   {(time.perf_counter() - start) / 10 * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Worker startup cost, to track across releases.
+
+    python -m benchmarks.startup [runs]
+
+Each run is a fresh interpreter against an already migrated SQLite database and measures:
+  import      - `from app import create_app`
+  create_app  - building the application (namespaces, schemas and models are imported here)
+  first req   - first GET /api/books/?limit=1 (creates the engine and the first connection)
+  second req  - the same request again
+  forked      - first request in a child forked after create_app(), i.e. a gunicorn --preload worker
+Medians over the runs are printed in milliseconds.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = """
+import json, os, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+client = app.test_client()
+assert client.get("/api/books/?limit=1").status_code == 200
+first = time.perf_counter()
+client.get("/api/books/?limit=1")
+second = time.perf_counter()
+read, write = os.pipe()
+pid = os.fork()
+if pid == 0:
+    forked = time.perf_counter()
+    app.test_client().get("/api/books/?limit=1")
+    os.write(write, str(time.perf_counter() - forked).encode())
+    os._exit(0)
+os.waitpid(pid, 0)
+print(json.dumps({
+    "import": imported - started,
+    "create_app": created - imported,
+    "first req": first - created,
+    "second req": second - first,
+    "forked": float(os.read(read, 64)),
+}))
+"""
+
+
+def main() -> None:
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    env = {**os.environ, "DATABASE_URL": "sqlite:///" + os.path.join(tempfile.mkdtemp(), "startup.db")}
+    subprocess.run([sys.executable, "-m", "flask", "--app", "wsgi", "migrate"], env=env, check=True, capture_output=True)
+
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", PROBE], env=env, check=True, capture_output=True, text=True)
+        samples.append(json.loads(output.stdout))
+    for name in samples[0]:
+        print(f"{name:>11}: {statistics.median(sample[name] for sample in samples) * 1000:7.1f} ms")
+    total = statistics.median(sum(sample[name] for name in ("import", "create_app", "first req")) for sample in samples)
+    print(f"{'cold total':>11}: {total * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Typeahead lookups against the prefix index.
+
+    python -m benchmarks.suggest [books]
+
+Builds app.search.suggest.PrefixIndex over synthetic books and times lookups for prefixes of
+one to five characters typed from real titles and authors, plus add()/remove() of a book and
+rating changes of the best rated books, the ones on the precomputed lists of short prefixes.
+Memory is measured with tracemalloc, which slows the build down.
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from app.search.suggest import PrefixIndex
+from benchmarks.importer import synthetic_rows
+
+
+def main() -> None:
+    books = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    random.seed(0)
+    rows = [(i + 1, row["title"], row["author"], random.random() * 5) for i, row in enumerate(synthetic_rows(books))]
+    index = PrefixIndex()
+    tracemalloc.start()
+    start = time.perf_counter()
+    index.build(rows)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"build {books} books: {elapsed:.2f} s, {len(index._starts)} keys")
+    print(f"memory: {current / 2**20:.1f} MiB held, {peak / 2**20:.1f} MiB peak while building")
+
+    words = [word for _, title, author, _ in random.sample(rows, 1000) for word in (title + " " + author).split()]
+    for length in range(1, 6):
+        prefixes = [word[:length] for word in words if len(word) >= length]
+        start = time.perf_counter()
+        for prefix in prefixes:
+            index.suggest(prefix, 10)
+        print(f"prefix of {length}: {(time.perf_counter() - start) / len(prefixes) * 1e6:8.1f} us")
+
+    best = sorted(rows, key=lambda row: row[3], reverse=True)[:1000]
+    start = time.perf_counter()
+    for book_id, title, author, rating in best:
+        index.add(book_id, title, author, rating / 2)
+    print(f"rating:      {(time.perf_counter() - start) / 1000 * 1e6:8.1f} us")
+    start = time.perf_counter()
+    for book_id, title, author, rating in rows[:1000]:
+        index.add(book_id, title + " 2", author, rating)
+    print(f"add:         {(time.perf_counter() - start) / 1000 * 1e6:8.1f} us")
+    start = time.perf_counter()
+    for book_id, *_ in rows[:1000]:
+        index.remove(book_id)
+    print(f"remove:      {(time.perf_counter() - start) / 1000 * 1e6:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,38 @@
+import os
+import tempfile
+
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL : str
     SECRET_KEY : str
     APP_PORT: int
+    BOOK_CACHE_SIZE: int = 10000
+    BOOK_CACHE_TTL: int = 300
+    # Bayesian ranking of the leaderboard: every book starts with this many virtual reviews of this mean
+    RATING_PRIOR_MEAN: float = 3.0
+    RATING_PRIOR_WEIGHT: int = 10
+    # Seconds after which a migration lock row left by a crashed `flask migrate` is taken over
+    MIGRATION_LOCK_TIMEOUT: int = 600
+    # Response compression (app/compression.py): smaller bodies are sent as is
+    COMPRESS_MIN_SIZE: int = 1024
+    COMPRESS_GZIP_LEVEL: int = 6
+    COMPRESS_BROTLI_QUALITY: int = 5
+    COMPRESS_ZSTD_LEVEL: int = 3
+    # Compressed catalog responses kept per worker, see compressed_cache
+    COMPRESS_CACHE_SIZE: int = 500
+    # "orjson" (falls back to "json" when not installed) or "json", see app/api/representations.py
+    JSON_ENCODER: str = "orjson"
+    # Seconds between background rebuilds of the "also bought" co-occurrence matrix, see app/recommend/also_bought.py
+    ALSO_BOUGHT_REBUILD_INTERVAL: int = 300
+    # Seconds a request waits for the first build of a worker's in-memory index before answering 503
+    INDEX_BUILD_WAIT: float = 2.0
+    # Catalog writes folded into an in-memory index per sync; more rebuild it in the background, see app/search/sync.py
+    INDEX_FOLD_IN_LIMIT: int = 5000
+    # Memory-mapped "similar books" matrix shared by the workers of a host, see app/recommend/similar.py
+    SIMILAR_INDEX_DIR: str = os.path.join(tempfile.gettempdir(), "book-store-similar")
+    # Books written since the last build that are folded in per worker before the matrix is rebuilt
+    SIMILAR_FOLD_IN_LIMIT: int = 1000
 
     class Config:
         env_file = '.env'
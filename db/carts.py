@@ -0,0 +1,232 @@
+from datetime import datetime
+
+from sqlalchemy import Integer, bindparam, delete, func, insert, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from db.models import Book, Cart, CartItem, OrderItem
+
+# Cart columns returned by every write, the cart part of the API response
+CART_COLUMNS = (Cart.id, Cart.user_id, Cart.total_price, Cart.item_count, Cart.created_at, Cart.updated_at)
+
+
+def upsert(db: Session, model):
+    """
+    INSERT with the dialect's ON CONFLICT clauses; PostgreSQL and SQLite spell them the same way.
+    None on other backends, where callers fall back to an INSERT in a SAVEPOINT and handle the conflict.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    return None
+
+
+def insert_or_conflict(db: Session, statement) -> bool:
+    """Run an INSERT in a SAVEPOINT; False if it hit a unique constraint, leaving the transaction usable"""
+    try:
+        with db.begin_nested():
+            db.execute(statement)
+        return True
+    except IntegrityError:
+        return False
+
+
+def get_or_create_cart(db: Session, user_id: int):
+    """
+    The user's cart row, created if missing. The INSERT skips a cart created concurrently by another
+    request (carts.user_id is unique), so two first adds from different tabs end up in the same cart.
+    """
+    query = select(*CART_COLUMNS).where(Cart.user_id == user_id)
+    cart = db.execute(query).one_or_none()
+    if cart is None:
+        values = {"user_id": user_id, "total_price": 0.0, "item_count": 0}
+        statement = upsert(db, Cart)
+        if statement is None:
+            insert_or_conflict(db, insert(Cart).values(**values))
+        else:
+            db.execute(statement.values(**values).on_conflict_do_nothing(index_elements=[Cart.user_id]))
+        cart = db.execute(query).one()
+    return cart
+
+
+def upsert_cart_items(db: Session, cart_id: int, quantities: dict, increment: bool = True) -> None:
+    """
+    Insert cart lines or update the existing ones in one atomic statement, run as executemany; line by line
+    on backends without ON CONFLICT. `quantities` maps book ids to quantities, added to the current ones or replacing them.
+    """
+    if not quantities:
+        return
+    statement = upsert(db, CartItem)
+    if statement is None:
+        for book_id, value in quantities.items():
+            if not insert_or_conflict(db, insert(CartItem).values(cart_id=cart_id, book_id=book_id, quantity=value)):
+                db.execute(
+                    update(CartItem)
+                    .where(CartItem.cart_id == cart_id, CartItem.book_id == book_id)
+                    .values(quantity=CartItem.quantity + value if increment else value, updated_at=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+        return
+    quantity = CartItem.quantity + statement.excluded.quantity if increment else statement.excluded.quantity
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.book_id],
+            set_={"quantity": quantity, "updated_at": datetime.utcnow()},
+        ),
+        [{"cart_id": cart_id, "book_id": book_id, "quantity": value} for book_id, value in quantities.items()],
+    )
+
+
+def apply_cart_delta(db: Session, cart_id: int, count_delta: int, price_delta: float):
+    """
+    Shift a cart's item_count and total_price by the effect of one line write, inside the caller's
+    transaction, and return the cart row. Callers pass the change of the line they wrote rather than
+    new totals, so two tabs editing the same cart add up instead of overwriting each other.
+    """
+    return db.execute(
+        update(Cart)
+        .where(Cart.id == cart_id)
+        .values(item_count=Cart.item_count + count_delta, total_price=Cart.total_price + price_delta)
+        .returning(*CART_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).one()
+
+
+def reset_cart(db: Session, cart_id: int):
+    """Zero the aggregates of a cart whose items were all deleted and return the cart row"""
+    return db.execute(
+        update(Cart)
+        .where(Cart.id == cart_id)
+        .values(item_count=0, total_price=0.0)
+        .returning(*CART_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).one()
+
+
+def move_cart_to_order(db: Session, cart_id: int, order_id: int) -> list:
+    """
+    Copy a cart's lines into order_items at the current book prices, then empty the cart.
+    Set-based: one INSERT ... SELECT and one DELETE whatever the cart size. Returns the inserted
+    (book_id, quantity, price) rows, the snapshot the order total must be computed from.
+    """
+    lines = (
+        select(literal(order_id, Integer), CartItem.book_id, CartItem.quantity, Book.price)
+        .join(Book, Book.id == CartItem.book_id)
+        .where(CartItem.cart_id == cart_id)
+        .order_by(CartItem.id)
+    )
+    if db.get_bind().dialect.insert_returning:
+        rows = db.execute(
+            insert(OrderItem)
+            .from_select(["order_id", "book_id", "quantity", "price"], lines)
+            .returning(OrderItem.book_id, OrderItem.quantity, OrderItem.price)
+        ).all()
+    else:
+        rows = [row[1:] for row in db.execute(lines)]
+        if rows:
+            db.execute(
+                insert(OrderItem),
+                [
+                    {"order_id": order_id, "book_id": book_id, "quantity": quantity, "price": price}
+                    for book_id, quantity, price in rows
+                ],
+            )
+    db.execute(delete(CartItem).where(CartItem.cart_id == cart_id))
+    reset_cart(db, cart_id)
+    return rows
+
+
+def reprice_book(db: Session, book_id: int, price_delta: float) -> None:
+    """Carry a book's price change into the total_price of every cart holding it"""
+    quantity = (
+        select(CartItem.quantity).where(CartItem.cart_id == Cart.id, CartItem.book_id == book_id).scalar_subquery()
+    )
+    db.execute(
+        update(Cart)
+        .where(Cart.id.in_(select(CartItem.cart_id).where(CartItem.book_id == book_id)))
+        .values(total_price=Cart.total_price + price_delta * quantity)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def remove_book_from_carts(db: Session, book_id: int, price: float) -> None:
+    """
+    Delete every cart line of a book that is being deleted and take the lines out of their carts'
+    aggregates. The quantities come back from the DELETE itself, so exactly what was removed is subtracted.
+    """
+    lines = db.execute(
+        delete(CartItem)
+        .where(CartItem.book_id == book_id)
+        .returning(CartItem.cart_id, CartItem.quantity)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not lines:
+        return
+    carts = Cart.__table__
+    db.connection().execute(
+        update(carts)
+        .where(carts.c.id == bindparam("line_cart_id"))
+        .values(
+            item_count=carts.c.item_count - bindparam("quantity"),
+            total_price=carts.c.total_price - bindparam("amount"),
+        ),
+        [{"line_cart_id": cart_id, "quantity": quantity, "amount": price * quantity} for cart_id, quantity in lines],
+    )
+
+
+def cart_state(db: Session, cart) -> dict:
+    """The API representation of a cart row: one query for its items"""
+    items = db.execute(
+        select(CartItem.book_id, CartItem.quantity).where(CartItem.cart_id == cart.id).order_by(CartItem.id)
+    )
+    return {
+        "id": cart.id,
+        "user_id": cart.user_id,
+        "items": [{"book_id": book_id, "quantity": quantity} for book_id, quantity in items],
+        "total_price": round(cart.total_price, 2),
+        "item_count": cart.item_count,
+        "created_at": cart.created_at,
+        "updated_at": cart.updated_at,
+    }
+
+
+def _aggregate(expression):
+    """Sum over the lines of the cart in the enclosing UPDATE, at current book prices"""
+    return (
+        select(func.coalesce(expression, 0))
+        .select_from(CartItem)
+        .join(Book, Book.id == CartItem.book_id)
+        .where(CartItem.cart_id == Cart.id)
+        .scalar_subquery()
+    )
+
+
+def recompute_cart(db: Session, cart_id: int):
+    """Set a cart's aggregates from its lines after a batch of writes and return the cart row"""
+    return db.execute(
+        update(Cart)
+        .where(Cart.id == cart_id)
+        .values(
+            item_count=_aggregate(func.sum(CartItem.quantity)),
+            total_price=_aggregate(func.sum(Book.price * CartItem.quantity)),
+        )
+        .returning(*CART_COLUMNS)
+        .execution_options(synchronize_session=False)
+    ).one()
+
+
+def repair_carts(db: Session) -> int:
+    """Recompute item_count and total_price of every cart from its items and the current book prices"""
+    result = db.execute(
+        update(Cart)
+        .values(
+            item_count=_aggregate(func.sum(CartItem.quantity)),
+            total_price=_aggregate(func.sum(Book.price * CartItem.quantity)),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
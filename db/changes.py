@@ -0,0 +1,37 @@
+"""
+What changed in the catalog since a given catalog version, for the in-memory indexes every worker keeps.
+
+Writes stamp what they touch with the catalog version they bump (db/versions.py): Book.text_version
+when a title, author or description is written, Book.rating_version when the rating is, a
+deleted_books row when a book is deleted. Versions
+are taken in commit order, so once a worker has read version V every change stamped up to V is
+visible to it, and catching up from the version it last synced at is a range scan over an index,
+whichever process made the writes.
+"""
+
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.orm import Session
+
+from db.models import DeletedBook
+
+
+def changed_books(db: Session, since: int, until: int, columns, stamps, limit: int):
+    """
+    Rows of `columns` for the books stamped after version `since` and up to `until` in any of the
+    `stamps` columns, or None when there are more than `limit` of them and a rebuild is cheaper
+    """
+    changed = or_(*(and_(stamp > since, stamp <= until) for stamp in stamps))
+    rows = db.execute(select(*columns).where(changed).limit(limit + 1)).all()
+    return None if len(rows) > limit else rows
+
+
+def deleted_books(db: Session, since: int) -> list:
+    """Ids of the books deleted after version `since`"""
+    return db.execute(select(DeletedBook.book_id).where(DeletedBook.version > since)).scalars().all()
+
+
+def record_deletions(db: Session, book_ids, version: int) -> None:
+    """Leave tombstones for deleted books inside the caller's transaction"""
+    rows = [{"book_id": book_id, "version": version} for book_id in book_ids]
+    if rows:
+        db.execute(insert(DeletedBook), rows)
@@ -1,4 +1,5 @@
-from sqlalchemy import create_engine
+import threading
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import scoped_session, sessionmaker
 from db.models import Base, User
 
@@ -6,20 +7,93 @@ from contextlib import contextmanager
 
 from config import settings
 
-engine = create_engine(url=settings.DATABASE_URL)
-SessionLocal = scoped_session(sessionmaker(autocommit=False, bind=engine))
+_engine = None
+_engine_lock = threading.Lock()
+SessionLocal = scoped_session(sessionmaker(autocommit=False))
 
-def init_db():
+
+def get_engine():
+    """
+    Create the engine on first use: after create_app() applied its config, and inside each worker
+    when gunicorn forks from a preloaded master, so no connection pool is shared across processes.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine = create_engine(url=settings.DATABASE_URL)
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
+
+
+def init_db() -> set:
+    """Create or upgrade the schema; returns the "table.column" names added to existing tables"""
+    engine = get_engine()
     Base.metadata.create_all(bind=engine)
+    # create_all skips existing tables, so add columns and indexes declared after a table was created
+    added = add_missing_columns()
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    if engine.dialect.name == "postgresql":
+        create_trigram_indexes()
+    elif engine.dialect.name == "sqlite":
+        analyze_sqlite()
+    return added
+
+
+def analyze_sqlite():
+    """
+    Refresh SQLite's planner statistics (PostgreSQL's autovacuum does this itself). Without them an
+    IN over many genres sorts every matching book instead of walking the primary key. analysis_limit
+    samples each index, so this stays fast on large tables.
+    """
+    with get_engine().begin() as connection:
+        connection.execute(text("PRAGMA analysis_limit=1000"))
+        connection.execute(text("ANALYZE"))
+
+
+def create_trigram_indexes():
+    """GIN trigram index for fuzzy genre search (app/search/genres.py); other databases match genres in-process"""
+    with get_engine().begin() as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(
+            text("CREATE INDEX IF NOT EXISTS ix_genres_name_trgm ON genres USING gin (name gin_trgm_ops)")
+        )
+
+
+def add_missing_columns() -> set:
+    """
+    ALTER TABLE ... ADD COLUMN for model columns absent from existing tables; they need a server_default.
+    Returns the "table.column" names added, so the migration can fill in columns derived from other data.
+    """
+    engine = get_engine()
+    inspector = inspect(engine)
+    added = set()
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or column.server_default is None:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                default = column.server_default.arg
+                connection.execute(
+                    text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type} NOT NULL DEFAULT {default}")
+                )
+                added.add(f"{table.name}.{column.name}")
+    return added
 
 
 def get_db():
+    get_engine()
     return SessionLocal()
 
 
 @contextmanager
 def session_scope():
-    session = SessionLocal()
+    session = get_db()
     try:
         yield session
         session.commit()
@@ -0,0 +1,70 @@
+"""
+Streaming export of the whole catalog as NDJSON or CSV.
+
+Rows come from a Core SELECT on a dedicated connection with stream_results, so the driver hands
+them over in chunks of CHUNK_ROWS (a server-side cursor on PostgreSQL) and no ORM objects, identity
+map entries or pydantic models are built. Each chunk is encoded and yielded at once, which keeps
+memory flat however big the catalog is.
+"""
+
+import csv
+import io
+import json
+
+from sqlalchemy import select
+from sqlalchemy.engine import Engine
+
+from db.models import Book, Genre
+
+CHUNK_ROWS = 2000
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+FIELDS = ("id", "title", "author", "price", "genre", "cover", "description", "rating", "year", "created_at",
+          "updated_at")  # fmt: skip
+
+
+def export_query():
+    return (
+        select(
+            Book.id, Book.title, Book.author, Book.price, Genre.name.label("genre"), Book.cover, Book.description,
+            Book.rating, Book.year, Book.created_at, Book.updated_at,
+        )  # fmt: skip
+        .join(Genre, Genre.id == Book.genre_id)
+        .order_by(Book.id)
+    )
+
+
+def _values(row) -> list:
+    """Row values with the two trailing timestamps in ISO format"""
+    *values, created_at, updated_at = row
+    values.append(created_at.isoformat() if created_at else None)
+    values.append(updated_at.isoformat() if updated_at else None)
+    return values
+
+
+def _ndjson(rows) -> str:
+    return "".join(json.dumps(dict(zip(FIELDS, _values(row))), ensure_ascii=False) + "\n" for row in rows)
+
+
+def _csv(rows, header: bool) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(FIELDS)
+    writer.writerows(_values(row) for row in rows)
+    return buffer.getvalue()
+
+
+def export_books(engine: Engine, fmt: str):
+    """Yield the catalog as encoded chunks; the connection is released when the generator ends or is closed"""
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=CHUNK_ROWS).execute(export_query())
+        if fmt == "csv":
+            header = True
+            for rows in result.partitions():
+                yield _csv(rows, header).encode("utf-8")
+                header = False
+            if header:
+                yield _csv((), header).encode("utf-8")
+        else:
+            for rows in result.partitions():
+                yield _ndjson(rows).encode("utf-8")
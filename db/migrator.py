@@ -1,7 +1,85 @@
 import json
+import os
+import socket
+import time
+from contextlib import contextmanager
 from pathlib import Path
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from config import settings
+from db.database import get_engine, init_db, session_scope
+from db.carts import repair_carts
 from db.models import Book, Genre
+from db.ratings import repair_ratings
+
+# Key of the PostgreSQL advisory lock and name of the lock row elsewhere
+MIGRATION_LOCK = 7_204_513
+
+
+@contextmanager
+def migration_lock():
+    """
+    Serialize migrations across processes: a session-level advisory lock on PostgreSQL, a row in
+    migration_locks on other databases. A lock row older than MIGRATION_LOCK_TIMEOUT is taken over,
+    so a migration killed halfway does not block the next deploy forever.
+    """
+    engine = get_engine()
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as connection:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK})
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK})
+                connection.commit()
+        return
+
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS migration_locks "
+                "(name INTEGER PRIMARY KEY, owner VARCHAR(100), acquired_at FLOAT NOT NULL)"
+            )
+        )
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    while True:
+        try:
+            with engine.begin() as connection:
+                connection.execute(
+                    text("INSERT INTO migration_locks (name, owner, acquired_at) VALUES (:name, :owner, :now)"),
+                    {"name": MIGRATION_LOCK, "owner": owner, "now": time.time()},
+                )
+            break
+        except IntegrityError:
+            with engine.begin() as connection:
+                connection.execute(
+                    text("DELETE FROM migration_locks WHERE name = :name AND acquired_at < :stale"),
+                    {"name": MIGRATION_LOCK, "stale": time.time() - settings.MIGRATION_LOCK_TIMEOUT},
+                )
+            time.sleep(0.5)
+    try:
+        yield
+    finally:
+        with engine.begin() as connection:
+            connection.execute(
+                text("DELETE FROM migration_locks WHERE name = :name AND owner = :owner"),
+                {"name": MIGRATION_LOCK, "owner": owner},
+            )
+
+
+def run_migrations() -> None:
+    """Create or upgrade the schema and seed the catalog; run once per deploy before the workers start"""
+    with migration_lock():
+        added = init_db()
+        with session_scope() as db:
+            # Aggregates added to a table that already has data start at their defaults; derive them once
+            if added & {"books.review_count", "books.rating_sum", "books.score"}:
+                repair_ratings(db)
+            if "carts.item_count" in added:
+                repair_carts(db)
+            migrate_books(db)
+
 
 def migrate_books(db: Session) -> None:
     """
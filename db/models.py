@@ -3,11 +3,13 @@ from datetime import datetime
 
 from flask_login import UserMixin
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Enum, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Enum, UniqueConstraint, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import enum
 
+from config import settings
+
 Base = declarative_base()
 
 class User(Base, UserMixin):
@@ -45,10 +47,40 @@ class Book(Base):
     cover = Column(String, nullable=False)
     description = Column(String, nullable=False)
     rating = Column(Float, nullable=False)
+    # Review aggregates maintained with every review write, rating == rating_sum / review_count
+    review_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    # Bayesian average of the ratings (db/ratings.py), the leaderboard sort key. No reviews means the prior mean
+    score = Column(
+        Float,
+        nullable=False,
+        default=lambda: settings.RATING_PRIOR_MEAN,
+        server_default=str(settings.RATING_PRIOR_MEAN),
+    )
     year = Column(Integer, nullable=False)
+    # Catalog version (db/versions.py) of the last write to title, author or description, see db/changes.py
+    text_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Catalog version of the last write to the rating, by a review or an update, see db/changes.py
+    rating_version = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Catalog filters and sorts (see app/api/filters.py): every sort key ends with id for keyset pagination,
+    # the genre_id-prefixed variants serve filtered listings and facet counts within a genre
+    __table_args__ = (
+        Index("ix_books_price_id", "price", "id"),
+        Index("ix_books_year_id", "year", "id"),
+        Index("ix_books_rating_id", "rating", "id"),
+        Index("ix_books_genre_price_id", "genre_id", "price", "id"),
+        Index("ix_books_genre_year_id", "genre_id", "year", "id"),
+        Index("ix_books_genre_rating_id", "genre_id", "rating", "id"),
+        Index("ix_books_score_id", "score", "id"),
+        Index("ix_books_genre_score_id", "genre_id", "score", "id"),
+        # In-memory indexes catch up on text and rating changes with range scans, see db/changes.py
+        Index("ix_books_text_version", "text_version"),
+        Index("ix_books_rating_version", "rating_version"),
+    )
+
 
 class Review(Base):
     __tablename__ = "reviews"
@@ -62,6 +94,9 @@ class Review(Base):
     book = relationship("Book", backref="reviews")
     user = relationship("User", backref="reviews")
 
+    # Pages of a book's reviews, newest first (GET /api/books/<id>/reviews)
+    __table_args__ = (Index("ix_reviews_book_created_id", "book_id", "created_at", "id"),)
+
 
 class OrderStatus(enum.Enum):
     PENDING = "pending"
@@ -106,7 +141,9 @@ class Cart(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, unique=True)
+    # Maintained with every cart write (db/carts.py): sum of price * quantity and of quantity over the items
     total_price = Column(Float, default=0.0)
+    item_count = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -131,3 +168,24 @@ class CartItem(Base):
 
     # Unique constraint to prevent duplicate books in cart
     __table_args__ = (UniqueConstraint("cart_id", "book_id", name="unique_cart_book"),)
+
+
+class CacheVersion(Base):
+    """Shared version stamps: workers drop cached data built under an older version"""
+
+    __tablename__ = "cache_versions"
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class DeletedBook(Base):
+    """Tombstone of a deleted book, so every worker drops it from its in-memory indexes (db/changes.py)"""
+
+    __tablename__ = "deleted_books"
+
+    id = Column(Integer, primary_key=True)
+    # Not unique: SQLite may hand the id of a deleted book to a new one, which can be deleted again
+    book_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, index=True)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
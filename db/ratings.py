@@ -0,0 +1,59 @@
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session
+
+from config import settings
+from db.models import Book, Review
+from db.versions import bump_version
+
+
+def weighted_rating(rating_sum, review_count):
+    """Bayesian average; works on numbers and on column expressions"""
+    prior_weight = settings.RATING_PRIOR_WEIGHT
+    return (prior_weight * settings.RATING_PRIOR_MEAN + rating_sum) / (prior_weight + review_count)
+
+
+def apply_review_delta(db: Session, book_id: int, count_delta: int, sum_delta: float, version: int) -> None:
+    """
+    Adjust a book's review aggregates inside the caller's transaction and stamp them with the catalog
+    version the caller bumped. A single UPDATE reads and writes the row, so concurrent reviews never lose an increment.
+    """
+    review_count = Book.review_count + count_delta
+    rating_sum = Book.rating_sum + sum_delta
+    db.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .values(
+            review_count=review_count,
+            rating_sum=rating_sum,
+            rating=case((review_count > 0, rating_sum / review_count), else_=0.0),
+            score=weighted_rating(rating_sum, review_count),
+            rating_version=version,
+        )
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def repair_ratings(db: Session) -> int:
+    """Recompute review_count, rating_sum, rating and score of every book from the reviews table"""
+
+    def aggregate(expression):
+        return select(expression).where(Review.book_id == Book.id).scalar_subquery()
+
+    version = bump_version(db)
+    result = db.execute(
+        update(Book)
+        .values(
+            review_count=aggregate(func.count(Review.id)),
+            rating_sum=aggregate(func.coalesce(func.sum(Review.rating), 0.0)),
+            rating=aggregate(func.coalesce(func.avg(Review.rating), 0.0)),
+            rating_version=version,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        update(Book)
+        .values(score=weighted_rating(Book.rating_sum, Book.review_count))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,32 @@
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from db.database import get_engine
+from db.models import CacheVersion
+
+# Bumped by every write to books, reviews and genres
+CATALOG = "catalog"
+
+
+def bump_version(db: Session, name: str = CATALOG) -> int:
+    """
+    Increment a version stamp inside the caller's transaction, so it commits together with the write, and
+    return the new value. The UPDATE keeps the row locked until commit, so versions are taken in commit order.
+    """
+    version = db.execute(
+        update(CacheVersion)
+        .where(CacheVersion.name == name)
+        .values(version=CacheVersion.version + 1)
+        .returning(CacheVersion.version)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if version is None:
+        db.add(CacheVersion(name=name, version=1))
+        version = 1
+    return version
+
+
+def current_version(name: str = CATALOG) -> int:
+    """Read the committed version on a short-lived connection, outside any ORM session"""
+    with get_engine().connect() as connection:
+        return connection.execute(select(CacheVersion.version).where(CacheVersion.name == name)).scalar() or 0
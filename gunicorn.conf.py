@@ -0,0 +1,8 @@
+# gunicorn reads this file from the working directory; bind address and workers come from the command line
+
+
+def post_fork(server, worker):
+    """Build the worker's in-memory indexes in the background while it starts accepting requests"""
+    from app.warmup import warm_up
+
+    warm_up()